@@ -24,8 +24,7 @@ from tabs import (
     tab11_evolution,
     tab12_defauts_historique,
 )
-from tabs import evi as evi_api
-from tabs import kpi as kpi_api
+from tabs import bundle as bundle_api
 from tabs import sessions as sessions_api
 import dashboard_home
 
@@ -172,21 +171,14 @@ def with_charge_link(df: pd.DataFrame, id_col: str = "ID", link_col: str = "Lien
     return out
 
 with st.spinner("Chargement des sessions..."):
-    sessions = sessions_api.fetch_sessions(site_id=None, start=None, end=None)
+    sessions = sessions_api.fetch_sessions(site_ids=(), start=None, end=None)
 
 if sessions.empty:
     st.error("Aucune donnée dans `sessions` — vérifier la configuration de l'API.")
     st.stop()
 
-with st.spinner("Chargement des KPI..."):
-    kpi_tables = kpi_api.fetch_kpis(site_id=None, start=None, end=None)
-
-with st.spinner("Chargement des événements EVI..."):
-    evi_long = evi_api.fetch_evi(site_id=None, start=None, end=None)
-
 evi_by_site = pd.DataFrame()
 evi_by_site_p = pd.DataFrame()
-tables = {**kpi_tables, "sessions": sessions, "evi_combo_long": evi_long}
 
 SITE_COL = "Site" if "Site" in sessions.columns else "Name Project"
 sites = sorted(sessions[SITE_COL].dropna().unique().tolist())
@@ -245,6 +237,21 @@ with c2:
         help="Choisissez un ou plusieurs sites",
     )
 
+# KPI et EVI limités aux sites sélectionnés ; une sélection vide ou complète charge tous les sites
+selected_site_ids: tuple = ()
+if "site_id" in sessions.columns and set(st.session_state.site_sel) != set(sites):
+    # int() : numpy.int64 n'est pas sérialisable en JSON
+    selected_site_ids = tuple(
+        int(site_id)
+        for site_id in sessions.loc[sessions[SITE_COL].isin(st.session_state.site_sel), "site_id"].dropna().unique()
+    )
+
+with st.spinner("Chargement des KPI et événements EVI..."):
+    bundle = bundle_api.fetch_bundle(site_ids=selected_site_ids, start=None, end=None)
+kpi_tables = bundle["kpis"]
+evi_long = bundle["evi"]
+tables = {**kpi_tables, "sessions": sessions, "evi_combo_long": evi_long}
+
 
 
 st.markdown("#### 📅 Période d'analyse")
@@ -585,8 +592,26 @@ mask_nok_keep = mask_nok & mask_type & mask_moment
 sess_kpi = sess.copy()
 sess_kpi["is_ok_filt"] = np.where(mask_nok_keep, False, True)
 
-total = len(sess_kpi)
-ok    = int(sess_kpi["is_ok_filt"].sum())
+# Totaux OK/NOK par site, moment et type calculés par l'API (/sessions/stats), même règle que is_ok_filt
+site_names = {}
+if "site_id" in sessions.columns:
+    site_names = {
+        int(site_id): name
+        for site_id, name in sessions[["site_id", SITE_COL]].dropna().drop_duplicates("site_id").itertuples(index=False)
+    }
+if st.session_state.site_sel:
+    session_stats = sessions_api.fetch_session_stats(
+        site_ids=selected_site_ids,
+        start=d1,
+        end=d2,
+        types=st.session_state.type_sel if "type_erreur" in sess.columns else (),
+        moments=st.session_state.moment_sel if {"type_erreur", "moment"}.issubset(sess.columns) else (),
+    )
+else:
+    session_stats = sessions_api.empty_session_stats()
+
+total = int(session_stats["summary"].get("total") or 0)
+ok    = int(session_stats["summary"].get("ok") or 0)
 nok   = total - ok
 taux_reussite = round(ok / total * 100, 2) if total else 0.0
 taux_echec    = round(nok / total * 100, 2) if total else 0.0
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.metrics import ADMISSION_REJECTED
+from app.settings import get_settings
+
+logger = logging.getLogger("app.admission")
+
+# Uncached analytics scans and full exports; sessions opened outside a request (background work) count as heavy too
+HEAVY_ROUTES = ("/sessions/stats", "/sessions/export", "/evi/export", "/kpis/export")
+
+
+class RouteClass(str, Enum):
+    standard = "standard"
+    heavy = "heavy"
+
+
+def classify(request: Optional[Request]) -> RouteClass:
+    if request is None:
+        return RouteClass.heavy
+    route = request.scope.get("route")
+    return RouteClass.heavy if getattr(route, "path", None) in HEAVY_ROUTES else RouteClass.standard
+
+
+class AdmissionController:
+    """Per-process gate in front of the connection pool.
+
+    At most `capacity` sessions hold a connection; heavy sessions are capped
+    at `heavy_slots` and only take a slot when no standard request is waiting.
+    Queues are bounded per class (429 when full) and waits are bounded by a
+    budget (503), both with `Retry-After`, instead of letting requests sit in
+    the pool queue for `pool_timeout`.
+    """
+
+    def __init__(self, capacity: int, heavy_slots: int, queue_limits: Dict[RouteClass, int]) -> None:
+        self.capacity = capacity
+        self.heavy_slots = heavy_slots
+        self.queue_limits = queue_limits
+        self.in_use = {route_class: 0 for route_class in RouteClass}
+        self.waiting = {route_class: 0 for route_class in RouteClass}
+        self._condition = asyncio.Condition()
+
+    def _can_take(self, route_class: RouteClass) -> bool:
+        if sum(self.in_use.values()) >= self.capacity:
+            return False
+        if route_class is RouteClass.heavy:
+            return self.in_use[RouteClass.heavy] < self.heavy_slots and not self.waiting[RouteClass.standard]
+        return True
+
+    def _reject(self, route_class: RouteClass, status_code: int, detail: str) -> HTTPException:
+        retry_after = get_settings().admission_retry_after_seconds
+        ADMISSION_REJECTED.labels(route_class=route_class.value, status=str(status_code)).inc()
+        logger.warning(
+            "admission_rejected",
+            extra={"event": "admission_rejected", "status_code": status_code, "route_class": route_class.value},
+        )
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+    async def acquire(self, route_class: RouteClass, budget: float) -> None:
+        async with self._condition:
+            if self._can_take(route_class):
+                self.in_use[route_class] += 1
+                return
+            if self.waiting[route_class] >= self.queue_limits[route_class]:
+                raise self._reject(route_class, status.HTTP_429_TOO_MANY_REQUESTS, "File d'attente saturée")
+            self.waiting[route_class] += 1
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: self._can_take(route_class)), budget)
+            except asyncio.TimeoutError:
+                raise self._reject(route_class, status.HTTP_503_SERVICE_UNAVAILABLE, "Base de données saturée")
+            finally:
+                self.waiting[route_class] -= 1
+                # A standard waiter leaving may unblock heavy ones
+                self._condition.notify_all()
+            self.in_use[route_class] += 1
+
+    async def release(self, route_class: RouteClass) -> None:
+        async with self._condition:
+            self.in_use[route_class] -= 1
+            self._condition.notify_all()
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_controller() -> Optional[AdmissionController]:
+    """Lazily built so the condition binds to the running loop; `None` when admission is off or unpooled."""
+    global _controller
+    settings = get_settings()
+    if not settings.admission_enabled or settings.pool_size <= 0:
+        return None
+    if _controller is None:
+        capacity = settings.pool_size + max(settings.max_overflow, 0)
+        heavy_slots = settings.admission_heavy_slots or max(capacity // 2, 1)
+        _controller = AdmissionController(
+            capacity,
+            min(heavy_slots, capacity),
+            {
+                RouteClass.standard: settings.admission_queue_limit,
+                RouteClass.heavy: settings.admission_heavy_queue_limit,
+            },
+        )
+    return _controller
+
+
+class AdmittedSession(AsyncSession):
+    """Session that takes an admission slot before its first statement and gives it back on close.
+
+    Cache hits never execute anything, so they never wait behind uncached
+    queries for a slot.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._admitted: Optional[RouteClass] = None
+
+    async def _admit(self) -> None:
+        controller = get_controller()
+        if self._admitted is not None or controller is None:
+            return
+        route_class = self.info.get("route_class", RouteClass.heavy)
+        settings = get_settings()
+        # Requests fail fast (exports set their own budget); work outside a request keeps the pool's own patience
+        budget = settings.admission_wait_budget_seconds if "route_class" in self.info else settings.pool_timeout
+        budget = self.info.get("admission_budget", budget)
+        await controller.acquire(route_class, budget)
+        self._admitted = route_class
+
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        await self._admit()
+        return await super().execute(*args, **kwargs)
+
+    async def stream(self, *args: Any, **kwargs: Any) -> Any:
+        await self._admit()
+        return await super().stream(*args, **kwargs)
+
+    async def close(self) -> None:
+        try:
+            await super().close()
+        finally:
+            if self._admitted is not None:
+                controller = get_controller()
+                if controller is not None:
+                    await controller.release(self._admitted)
+                self._admitted = None
@@ -1,25 +1,456 @@
-from fastapi import Request
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import uuid
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial, wraps
+from time import monotonic, time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
+from pydantic import BaseModel
 from redis.asyncio import from_url
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.admission import RouteClass, classify
+from app.cache_backends import TieredBackend
+from app.compression import accepts_encoding, compress, decompress, is_compressible, negotiate_encoding
+from app.database import SessionLocal
+from app.filters import canonical_site_ids, split_values
+from app.metrics import CACHE_REQUESTS
+from app.responses import ResponseFormat, negotiate_format
 from app.settings import get_settings
+from app.versions import get_data_version
+
+logger = logging.getLogger("app.cache")
+
+CACHE_STATUS_HEADER = "X-Cache"
+_REQUEST_PARAM = "__cache_request"
+_LOCK_POLL_SECONDS = 0.05
+_RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+# Misses being computed in this process, shared by every concurrent request for the same key
+_inflight: Dict[str, "asyncio.Task[Tuple[CachedResponse, str]]"] = {}
 
 
 async def init_cache() -> None:
     settings = get_settings()
-    redis = from_url(settings.redis_url, encoding="utf-8", decode_responses=True)
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    # Raw bytes: cached bodies may be Arrow/Parquet as well as JSON
+    redis = from_url(settings.redis_url)
+    backend = TieredBackend(
+        RedisBackend(redis),
+        max_bytes=settings.cache_l1_max_bytes,
+        default_ttl=settings.cache_l1_ttl_seconds,
+        namespace_ttls=settings.cache_l1_namespace_ttls,
+        enabled=settings.cache_l1_enabled,
+    )
+    FastAPICache.init(backend, prefix="fastapi-cache")
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters per tier for this worker."""
+    backend = FastAPICache.get_backend()
+    return backend.snapshot() if isinstance(backend, TieredBackend) else {}
+
+
+# List parameters whose order and repetitions do not change the response
+_LIST_PARAMS: Dict[str, Callable[[List[str]], List[Any]]] = {
+    "site_id": canonical_site_ids,
+    "fields": lambda values: sorted(set(split_values(values))),
+}
+
 
+def _canonical_params(params: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Collapse repeated and comma-separated list parameters into one sorted, de-duplicated value."""
+    params = list(params)
+    canonical = [(key, value) for key, value in params if key not in _LIST_PARAMS]
+    for key, canonicalise in _LIST_PARAMS.items():
+        values = [value for name, value in params if name == key]
+        if not values:
+            continue
+        try:
+            canonical.append((key, ",".join(str(value) for value in canonicalise(values))))
+        except ValueError:
+            # Rejected by the endpoint anyway
+            canonical.extend((key, value) for value in values)
+    return canonical
 
-def cache_key_builder(func, namespace: str, request: Request, response=None):  # type: ignore[override]
-    params = request.query_params.multi_items()
-    parts = [namespace, request.url.path]
-    for key, value in sorted(params):
+
+def build_cache_key(
+    namespace: str,
+    path: str,
+    params: Iterable[Tuple[str, str]],
+    response_format: ResponseFormat,
+    data_version: Optional[float] = None,
+) -> str:
+    parts = [namespace, path]
+    if data_version is not None:
+        # Versioned namespace: a refresh moves readers to new keys, old entries simply age out
+        parts.append(f"v={data_version!r}")
+    for key, value in sorted(_canonical_params(params)):
         parts.append(f"{key}={value}")
+    # The same URL can be negotiated to another body through the Accept header
+    parts.append(f"fmt={response_format.value}")
     return ":".join(parts)
 
 
-def cache_response(expire: int, namespace: str):
-    return cache(expire=expire, namespace=namespace, key_builder=cache_key_builder)
+def cache_key_builder(
+    func, namespace: str, request: Request, response=None, *args, data_version: Optional[float] = None, **kwargs
+):  # type: ignore[override]
+    return build_cache_key(
+        namespace, request.url.path, request.query_params.multi_items(), negotiate_format(request), data_version
+    )
+
+
+@dataclass
+class CachedResponse:
+    """Encoded response body as stored in the cache backend."""
+
+    body: bytes
+    media_type: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    stored_at: float = field(default_factory=time)
+
+    def dumps(self) -> bytes:
+        meta = {"media_type": self.media_type, "headers": self.headers, "stored_at": self.stored_at}
+        return json.dumps(meta).encode("utf-8") + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "CachedResponse":
+        meta, _, body = raw.partition(b"\n")
+        decoded = json.loads(meta)
+        return cls(
+            body=body,
+            media_type=decoded["media_type"],
+            headers=decoded["headers"],
+            stored_at=decoded.get("stored_at", 0.0),
+        )
+
+    @classmethod
+    def from_result(cls, result: Any) -> "CachedResponse":
+        if isinstance(result, Response):
+            headers = {
+                key: value
+                for key, value in result.headers.items()
+                if key.lower() not in ("content-length", "content-type")
+            }
+            return cls(body=bytes(result.body), media_type=result.media_type or "application/json", headers=headers)
+        if isinstance(result, BaseModel):
+            return cls(body=result.model_dump_json().encode("utf-8"), media_type="application/json")
+        body = json.dumps(jsonable_encoder(result), ensure_ascii=False).encode("utf-8")
+        return cls(body=body, media_type="application/json")
+
+    def compressed(self, accept_encoding: Optional[str]) -> "CachedResponse":
+        """Compress once before storing, with the encoding negotiated for the request that missed."""
+        if "content-encoding" in self.headers or not is_compressible(self.media_type):
+            return self
+        if len(self.body) < get_settings().compression_minimum_size:
+            return self
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding is None:
+            return self
+        headers = {**self.headers, "content-encoding": encoding, "vary": "Accept-Encoding"}
+        return CachedResponse(
+            body=compress(self.body, encoding), media_type=self.media_type, headers=headers, stored_at=self.stored_at
+        )
+
+    def to_response(self, cache_status: str, accept_encoding: Optional[str] = None) -> Response:
+        body, headers = self.body, dict(self.headers)
+        encoding = headers.get("content-encoding")
+        if encoding is not None and not accepts_encoding(accept_encoding, encoding):
+            # Rare client that cannot read the stored encoding; the middleware may re-encode
+            body = decompress(body, encoding)
+            headers.pop("content-encoding")
+        return Response(
+            content=body,
+            media_type=self.media_type,
+            headers={**headers, CACHE_STATUS_HEADER: cache_status},
+        )
+
+
+def _cacheable(request: Optional[Request]) -> bool:
+    if request is None or not FastAPICache.get_enable():
+        return False
+    if request.method != "GET":
+        return False
+    return request.headers.get("Cache-Control") != "no-store"
+
+
+async def _data_version(source: Optional[str]) -> Optional[float]:
+    if source is None:
+        return None
+    try:
+        return await get_data_version(source)
+    except Exception:
+        logger.warning("data_version_get_failed", extra={"event": "data_version_get_failed"}, exc_info=True)
+        return None
+
+
+def _etag(cache_key: str) -> str:
+    digest = hashlib.sha1(cache_key.encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _validator_headers(etag: str, version: float) -> Dict[str, str]:
+    return {
+        "etag": etag,
+        "last-modified": formatdate(version, usegmt=True),
+        "cache-control": f"private, max-age={get_settings().conditional_max_age}, must-revalidate",
+    }
+
+
+def _not_modified(request: Request, etag: str, version: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison: the body is identical whatever the negotiated content-encoding
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        return int(version) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+async def _acquire_lock(backend: Any, lock_key: str) -> Tuple[bool, Optional[str]]:
+    """Return `(acquired, token)`; without a Redis client the process-local single-flight is all there is."""
+    redis = getattr(backend, "redis", None)
+    if redis is None:
+        return True, None
+    token = uuid.uuid4().hex
+    try:
+        acquired = await redis.set(lock_key, token, nx=True, ex=get_settings().cache_lock_ttl_seconds)
+    except Exception:
+        logger.warning("cache_lock_failed", extra={"event": "cache_lock_failed"}, exc_info=True)
+        return True, None
+    return bool(acquired), token
+
+
+async def _release_lock(backend: Any, lock_key: str, token: Optional[str]) -> None:
+    if token is None:
+        return
+    try:
+        await backend.redis.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+    except Exception:
+        logger.warning("cache_unlock_failed", extra={"event": "cache_unlock_failed"}, exc_info=True)
+
+
+async def _wait_for_entry(backend: Any, cache_key: str) -> Optional[CachedResponse]:
+    """Poll for the entry another replica is computing, giving up after `cache_lock_wait_seconds`."""
+    deadline = monotonic() + get_settings().cache_lock_wait_seconds
+    while monotonic() < deadline:
+        await asyncio.sleep(_LOCK_POLL_SECONDS)
+        try:
+            cached = await backend.get(cache_key)
+        except Exception:
+            return None
+        if cached is not None:
+            return CachedResponse.loads(cached)
+    return None
+
+
+async def _compute_once(
+    backend: Any, cache_key: str, expire: int, compute: Callable[[], Awaitable[CachedResponse]]
+) -> Tuple[CachedResponse, str]:
+    lock_key = f"{cache_key}:lock"
+    acquired, token = await _acquire_lock(backend, lock_key)
+    if not acquired:
+        entry = await _wait_for_entry(backend, cache_key)
+        if entry is not None:
+            return entry, "COALESCED"
+        logger.warning("cache_lock_wait_timeout", extra={"event": "cache_lock_wait_timeout"})
+
+    try:
+        entry = await compute()
+        try:
+            await backend.set(cache_key, entry.dumps(), expire)
+        except Exception:
+            logger.warning("cache_set_failed", extra={"event": "cache_set_failed"}, exc_info=True)
+    finally:
+        await _release_lock(backend, lock_key, token)
+    return entry, "MISS"
+
+
+async def _single_flight(
+    backend: Any, cache_key: str, expire: int, compute: Callable[[], Awaitable[CachedResponse]]
+) -> Tuple[CachedResponse, str]:
+    """Run one computation per key: in-process through a shared task, across replicas through a Redis lock.
+
+    The task outlives the request that started it, so a disconnecting leader
+    does not fail the requests waiting on it.
+    """
+    task = _inflight.get(cache_key)
+    if task is not None:
+        entry, _ = await asyncio.shield(task)
+        return entry, "COALESCED"
+    task = asyncio.create_task(_compute_once(backend, cache_key, expire, compute))
+    _inflight[cache_key] = task
+    task.add_done_callback(lambda _: _inflight.pop(cache_key, None))
+    return await asyncio.shield(task)
+
+
+def _log_revalidate_failure(task: "asyncio.Task[Tuple[CachedResponse, str]]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(
+            "cache_revalidate_failed", extra={"event": "cache_revalidate_failed"}, exc_info=task.exception()
+        )
+
+
+def _revalidate(
+    backend: Any, cache_key: str, expire: int, compute: Callable[[], Awaitable[CachedResponse]]
+) -> None:
+    """Refresh a stale entry in the background, unless this process is already computing it."""
+    if cache_key in _inflight:
+        return
+    task = asyncio.create_task(_compute_once(backend, cache_key, expire, compute))
+    _inflight[cache_key] = task
+    task.add_done_callback(lambda _: _inflight.pop(cache_key, None))
+    task.add_done_callback(_log_revalidate_failure)
+
+
+def cache_response(
+    expire: int, namespace: str, source: Optional[str] = None, stale_ttl: Optional[int] = None
+):
+    """Cache the encoded response of an endpoint in the FastAPICache backend.
+
+    Bodies are stored already serialised, so hits skip model validation and
+    endpoints may return either a model or a ready `Response` (Arrow, Parquet).
+    When `source` names a tracked table or view, its data version is part of
+    the cache key, responses carry validators derived from it and conditional
+    requests are answered with 304 from that version alone. Concurrent misses
+    for one key share a single computation (see `_single_flight`).
+
+    `expire` is the soft TTL: for `stale_ttl` seconds past it (default
+    `cache_stale_ttl`) the stale entry is still served while a background
+    task recomputes it. Misses and refreshes both run on their own database
+    session, never on the one injected into the request that triggered them.
+    """
+
+    def decorator(func: Callable):
+        signature = inspect.signature(func)
+        request_param = next(
+            (name for name, param in signature.parameters.items() if param.annotation is Request), None
+        )
+        injected = request_param is None
+        if injected:
+            request_param = _REQUEST_PARAM
+            extra = inspect.Parameter(_REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+            signature = signature.replace(parameters=[*signature.parameters.values(), extra])
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs.pop(request_param, None) if injected else kwargs.get(request_param)
+            if not _cacheable(request):
+                return await func(*args, **kwargs)
+
+            backend = FastAPICache.get_backend()
+            version = await _data_version(source)
+            cache_key = cache_key_builder(
+                func, f"{FastAPICache.get_prefix()}:{namespace}", request, data_version=version
+            )
+
+            validators: Dict[str, str] = {}
+            if version is not None:
+                etag = _etag(cache_key)
+                validators = _validator_headers(etag, version)
+                if _not_modified(request, etag, version):
+                    CACHE_REQUESTS.labels(namespace=namespace, result="REVALIDATED").inc()
+                    return Response(status_code=304, headers={**validators, CACHE_STATUS_HEADER: "REVALIDATED"})
+
+            cached: Optional[bytes] = None
+            if request.headers.get("Cache-Control") != "no-cache":
+                try:
+                    cached = await backend.get(cache_key)
+                except Exception:
+                    logger.warning("cache_get_failed", extra={"event": "cache_get_failed"}, exc_info=True)
+            accept_encoding = request.headers.get("accept-encoding")
+            stale_seconds = get_settings().cache_stale_ttl if stale_ttl is None else stale_ttl
+
+            async def compute(call_kwargs: Dict[str, Any]) -> CachedResponse:
+                entry = CachedResponse.from_result(await func(*args, **call_kwargs)).compressed(accept_encoding)
+                # Validators of the version read before the query, so a concurrent change only ever forces a refetch
+                entry.headers = {**entry.headers, **validators}
+                return entry
+
+            async def compute_detached(route_class: Optional[RouteClass] = None) -> CachedResponse:
+                # Never the request's session: it closes once that request's response is sent or its client leaves
+                async with SessionLocal() as session:
+                    if route_class is not None:
+                        session.info["route_class"] = route_class
+                    detached = {
+                        name: session if isinstance(value, AsyncSession) else value for name, value in kwargs.items()
+                    }
+                    return await compute(detached)
+
+            if cached is not None:
+                entry, cache_status = CachedResponse.loads(cached), "HIT"
+                if stale_seconds and time() - entry.stored_at > expire:
+                    _revalidate(backend, cache_key, expire + stale_seconds, compute_detached)
+                    cache_status = "STALE"
+            else:
+                entry, cache_status = await _single_flight(
+                    backend, cache_key, expire + stale_seconds, partial(compute_detached, classify(request))
+                )
+            CACHE_REQUESTS.labels(namespace=namespace, result=cache_status).inc()
+            return entry.to_response(cache_status, accept_encoding)
+
+        wrapper.__signature__ = signature  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
+
+
+async def cached_part(
+    namespace: str,
+    source: Optional[str],
+    expire: int,
+    path: str,
+    params: Dict[str, str],
+    compute: Callable[[], Awaitable[Any]],
+) -> Tuple[bytes, str]:
+    """Uncompressed JSON body of one part of a composite response, cached like the matching GET endpoint.
+
+    The key follows `build_cache_key` for `path` and `params`, so a part and a
+    GET request with the same query string share one entry. `compute` must
+    open its own database session: it may also run as a background refresh.
+    """
+    if not FastAPICache.get_enable():
+        return CachedResponse.from_result(await compute()).body, "BYPASS"
+
+    backend = FastAPICache.get_backend()
+    version = await _data_version(source)
+    cache_key = build_cache_key(
+        f"{FastAPICache.get_prefix()}:{namespace}", path, params.items(), ResponseFormat.json, version
+    )
+    validators = _validator_headers(_etag(cache_key), version) if version is not None else {}
+    stale_seconds = get_settings().cache_stale_ttl
+
+    async def compute_entry() -> CachedResponse:
+        entry = CachedResponse.from_result(await compute())
+        entry.headers = {**entry.headers, **validators}
+        return entry
+
+    cached: Optional[bytes] = None
+    try:
+        cached = await backend.get(cache_key)
+    except Exception:
+        logger.warning("cache_get_failed", extra={"event": "cache_get_failed"}, exc_info=True)
+    if cached is not None:
+        entry, cache_status = CachedResponse.loads(cached), "HIT"
+        if stale_seconds and time() - entry.stored_at > expire:
+            _revalidate(backend, cache_key, expire + stale_seconds, compute_entry)
+            cache_status = "STALE"
+    else:
+        entry, cache_status = await _single_flight(backend, cache_key, expire + stale_seconds, compute_entry)
+    CACHE_REQUESTS.labels(namespace=namespace, result=cache_status).inc()
+
+    encoding = entry.headers.get("content-encoding")
+    return (decompress(entry.body, encoding) if encoding else entry.body), cache_status
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.redis import RedisBackend
+
+logger = logging.getLogger("app.cache")
+
+INVALIDATION_CHANNEL = "cache-invalidate"
+
+
+@dataclass
+class TierStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class TieredBackend(Backend):
+    """Bounded in-process LRU (L1) in front of `RedisBackend` (L2).
+
+    Only keys written with an expiry are mirrored in L1, for at most their
+    namespace's L1 TTL; keys without expiry (data versions, counters) always
+    come from Redis. Writes and clears are announced on pub/sub so the other
+    workers drop their copy.
+    """
+
+    def __init__(
+        self,
+        l2: RedisBackend,
+        max_bytes: int,
+        default_ttl: int,
+        namespace_ttls: Optional[Dict[str, int]] = None,
+        enabled: bool = True,
+    ) -> None:
+        self.l2 = l2
+        self.redis = l2.redis
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.namespace_ttls = namespace_ttls or {}
+        self.enabled = enabled
+        self.stats = {"l1": TierStats(), "l2": TierStats()}
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._size = 0
+        self._instance = uuid.uuid4().hex
+
+    def _l1_ttl(self, key: str) -> int:
+        # Keys look like "<prefix>:<namespace>:<path>..."
+        parts = key.split(":", 2)
+        namespace = parts[1] if len(parts) > 1 else ""
+        return self.namespace_ttls.get(namespace, self.default_ttl)
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(key) + len(entry[0])
+
+    def _discard_prefix(self, prefix: str) -> None:
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._discard(key)
+
+    def _store(self, key: str, value: bytes, expire: Optional[int]) -> None:
+        self._discard(key)
+        if not self.enabled or not expire or expire <= 0:
+            return
+        ttl = min(expire, self._l1_ttl(key))
+        size = len(key) + len(value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        self._entries[key] = (value, monotonic() + ttl)
+        self._size += size
+        while self._size > self.max_bytes:
+            old_key, (old_value, _) = self._entries.popitem(last=False)
+            self._size -= len(old_key) + len(old_value)
+            self.stats["l1"].evictions += 1
+
+    def _lookup(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if self.enabled:
+            value = self._lookup(key)
+            if value is not None:
+                self.stats["l1"].hits += 1
+                return value
+            self.stats["l1"].misses += 1
+
+        ttl, value = await self.l2.get_with_ttl(key)
+        if value is None:
+            self.stats["l2"].misses += 1
+            return None
+        self.stats["l2"].hits += 1
+        self._store(key, value, ttl)
+        return value
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        return await self.l2.get_with_ttl(key)
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await self.l2.set(key, value, expire)
+        self._store(key, value, expire)
+        await self._announce("key", key)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        removed = await self.l2.clear(namespace, key)
+        if namespace:
+            self._discard_prefix(f"{namespace}:")
+            await self._announce("namespace", f"{namespace}:")
+        elif key:
+            self._discard(key)
+            await self._announce("key", key)
+        return removed
+
+    async def _announce(self, kind: str, target: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self.redis.publish(INVALIDATION_CHANNEL, f"{self._instance}\t{kind}\t{target}")
+        except Exception:
+            logger.warning("cache_invalidation_publish_failed", extra={"event": "cache_invalidation_publish_failed"})
+
+    async def listen_for_invalidations(self, retry_seconds: float = 5.0) -> None:
+        """Drop L1 copies that another worker has overwritten or cleared."""
+        if not self.enabled:
+            return
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        instance, kind, target = message["data"].decode().split("\t", 2)
+                        if instance == self._instance:
+                            continue
+                        if kind == "namespace":
+                            self._discard_prefix(target)
+                        else:
+                            self._discard(target)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Invalidations may have been missed while disconnected
+                self._entries.clear()
+                self._size = 0
+                logger.warning(
+                    "cache_invalidation_listener_failed",
+                    extra={"event": "cache_invalidation_listener_failed"},
+                    exc_info=True,
+                )
+                await asyncio.sleep(retry_seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "l1": {
+                **asdict(self.stats["l1"]),
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            },
+            "l2": asdict(self.stats["l2"]),
+        }
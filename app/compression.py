@@ -0,0 +1,210 @@
+import gzip
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.settings import get_settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Bodies that are already compressed (Parquet pages, images) are left alone
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/vnd.apache.arrow.stream",
+    "text/",
+)
+
+
+class _StreamEncoder:
+    def __init__(self, chunk: Callable[[bytes], bytes], finish: Callable[[], bytes]) -> None:
+        self.chunk = chunk
+        self.finish = finish
+
+
+def _gzip_stream() -> _StreamEncoder:
+    compressor = zlib.compressobj(get_settings().compression_gzip_level, zlib.DEFLATED, 31)
+    return _StreamEncoder(
+        lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def _brotli_stream() -> _StreamEncoder:
+    compressor = brotli.Compressor(quality=get_settings().compression_brotli_quality)
+    return _StreamEncoder(lambda data: compressor.process(data) + compressor.flush(), compressor.finish)
+
+
+def _zstd_stream() -> _StreamEncoder:
+    compressor = zstandard.ZstdCompressor(level=get_settings().compression_zstd_level).compressobj()
+    return _StreamEncoder(
+        lambda data: compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        compressor.flush,
+    )
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    settings = get_settings()
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=settings.compression_zstd_level).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.compression_brotli_quality)
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level)
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(body)
+    if encoding == "br":
+        return brotli.decompress(body)
+    return gzip.decompress(body)
+
+
+def available_encodings() -> List[str]:
+    """Encodings in server preference order, restricted to the installed codecs."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    if not accept_encoding:
+        return None
+    accepted = _parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates: List[Tuple[float, int, str]] = []
+    for rank, encoding in enumerate(available_encodings()):
+        quality = accepted.get(encoding, wildcard)
+        if quality > 0:
+            candidates.append((quality, -rank, encoding))
+    if not candidates:
+        return None
+    return max(candidates)[2]
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    accepted = _parse_accept_encoding(accept_encoding or "")
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def is_compressible(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Negotiated zstd/brotli/gzip compression for bodies above `compression_minimum_size`.
+
+    Responses that already carry a `Content-Encoding` (compressed cache hits)
+    pass through untouched. Streaming bodies are compressed chunk by chunk.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, encoding)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.send: Send
+        self.start_message: Optional[Message] = None
+        self.stream: Optional[_StreamEncoder] = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers or not is_compressible(headers.get("content-type"))
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if not more_body:
+                if len(body) < get_settings().compression_minimum_size:
+                    await self.send(self.start_message)
+                    await self.send(message)
+                    self.start_message = None
+                    return
+                body = compress(body, self.encoding)
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": body})
+                self.start_message = None
+                return
+
+            self.stream = {"zstd": _zstd_stream, "br": _brotli_stream}.get(self.encoding, _gzip_stream)()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["Content-Length"]
+            await self.send(self.start_message)
+            self.start_message = None
+
+        if self.stream is None:  # pragma: no cover - start message is always sent first
+            await self.send(message)
+            return
+        chunk = self.stream.chunk(body)
+        if not more_body:
+            chunk += self.stream.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -1,7 +1,11 @@
+from fastapi import Request
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool
 
+from app.admission import AdmittedSession, classify
+from app.metrics import TimedQueuePool, instrument_engine
 from app.settings import get_settings
+from app.slow_queries import instrument_slow_queries
 
 settings = get_settings()
 engine = create_async_engine(
@@ -10,11 +14,16 @@ engine = create_async_engine(
     max_overflow=settings.max_overflow,
     pool_timeout=settings.pool_timeout,
     pool_pre_ping=True,
-    poolclass=None if settings.pool_size > 0 else NullPool,
+    poolclass=TimedQueuePool if settings.pool_size > 0 else NullPool,
+)
+instrument_engine(engine.sync_engine)
+instrument_slow_queries(engine)
+SessionLocal = async_sessionmaker(
+    bind=engine, class_=AdmittedSession, expire_on_commit=False, autoflush=False, autocommit=False
 )
-SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False, autocommit=False)
 
 
-async def get_db() -> AsyncSession:
+async def get_db(request: Request) -> AsyncSession:
     async with SessionLocal() as session:
+        session.info["route_class"] = classify(request)
         yield session
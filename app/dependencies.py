@@ -1,5 +1,8 @@
-from fastapi import Depends, Header, HTTPException, status
+from typing import Callable, List, Optional, Sequence, Tuple
 
+from fastapi import Depends, Header, HTTPException, Query, status
+
+from app.filters import canonical_site_ids, split_values
 from app.settings import get_settings
 
 
@@ -15,3 +18,42 @@ async def verify_token(authorization: str | None = Header(default=None)) -> None
 
 def get_settings_dependency():
     return get_settings()
+
+
+async def site_ids_query(
+    site_id: Optional[List[str]] = Query(
+        default=None, description="Sites à inclure (répétable ou séparés par des virgules)"
+    ),
+) -> Optional[List[int]]:
+    if not site_id:
+        return None
+    try:
+        site_ids = canonical_site_ids(site_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="site_id doit contenir des entiers"
+        )
+    return site_ids or None
+
+
+def fields_query(columns: Sequence[str]) -> Callable[..., Optional[Tuple[str, ...]]]:
+    """Dependency validating `fields=` against `columns`; the projection keeps the listing's column order."""
+
+    async def dependency(
+        fields: Optional[List[str]] = Query(
+            default=None,
+            description=f"Colonnes à renvoyer parmi {', '.join(columns)} (répétable ou séparées par des virgules)",
+        ),
+    ) -> Optional[Tuple[str, ...]]:
+        if not fields:
+            return None
+        requested = set(split_values(fields))
+        unknown = requested - set(columns)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Colonnes inconnues : {', '.join(sorted(unknown))}",
+            )
+        return tuple(column for column in columns if column in requested) or None
+
+    return dependency
@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from time import perf_counter
+from typing import Any, AsyncIterator, Dict, Iterable, Sequence
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.engine import RowMapping
+from starlette.background import BackgroundTask
+
+from app.admission import classify
+from app.database import SessionLocal
+from app.settings import get_settings
+
+logger = logging.getLogger("app.export")
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type {type(value).__name__} is not JSON serializable")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_lines(records: Iterable[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(records)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_chunk(rows: Sequence[RowMapping], columns: Sequence[str], export_format: ExportFormat) -> bytes:
+    if export_format is ExportFormat.ndjson:
+        lines = [json.dumps(dict(row), default=_json_default, ensure_ascii=False) for row in rows]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+    return _csv_lines([_csv_value(row[column]) for column in columns] for row in rows)
+
+
+async def stream_export(
+    request: Request,
+    query: str,
+    params: Dict[str, Any],
+    columns: Sequence[str],
+    export_format: ExportFormat,
+    filename: str,
+) -> StreamingResponse:
+    """Stream a query result through a server-side cursor, one bounded chunk at a time.
+
+    The session is opened here rather than through `get_db`: dependency
+    teardown runs before the body is sent, which would close the cursor under
+    a streaming response. The admission slot and the first execute are taken
+    before the response starts, so a rejection is still a real 429/503 with
+    `Retry-After` instead of a truncated 200.
+    """
+    settings = get_settings()
+    chunk_size = settings.export_chunk_size
+    session = SessionLocal()
+    session.info["route_class"] = classify(request)
+    session.info["admission_budget"] = settings.admission_export_wait_budget_seconds
+    try:
+        result = await session.stream(text(query).execution_options(yield_per=chunk_size), params)
+    except BaseException:
+        await session.close()
+        raise
+
+    async def _generate() -> AsyncIterator[bytes]:
+        start = perf_counter()
+        exported = 0
+        try:
+            if export_format is ExportFormat.csv:
+                yield _csv_lines([columns])
+            async for rows in result.mappings().partitions(chunk_size):
+                exported += len(rows)
+                yield _encode_chunk(rows, columns, export_format)
+        finally:
+            await session.close()
+
+        logger.info(
+            "export_completed",
+            extra={
+                "event": "export_completed",
+                "view": filename,
+                "total": exported,
+                "duration_ms": round((perf_counter() - start) * 1000, 2),
+            },
+        )
+
+    extension = export_format.value
+    return StreamingResponse(
+        _generate(),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'},
+        # Also closes the session when the client leaves before the body is ever iterated
+        background=BackgroundTask(session.close),
+    )
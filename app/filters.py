@@ -0,0 +1,73 @@
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+
+# The dashboard's OK rule: `status` carries the charge state flag (0 good, 1 error) read as a number, and a
+# missing or non-numeric status counts as good
+SESSION_FAILED = (
+    r"COALESCE(TRUNC(CASE WHEN status ~ '^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)\s*$' THEN status::NUMERIC END), 0) <> 0"
+)
+
+
+def day_range_filters(
+    column: str, start_date: Optional[date], end_date: Optional[date]
+) -> Tuple[List[str], Dict[str, Any]]:
+    """Turn inclusive calendar-day bounds into a half-open range on the raw timestamp column.
+
+    `DATE(column) BETWEEN ...` hides the column behind a function and forces a
+    sequential scan; comparing the column itself keeps the b-tree index usable.
+    """
+    filters: List[str] = []
+    params: Dict[str, Any] = {}
+
+    if start_date is not None:
+        filters.append(f"{column} >= :start_at")
+        params["start_at"] = datetime.combine(start_date, time.min)
+    if end_date is not None:
+        filters.append(f"{column} < :end_before")
+        params["end_before"] = datetime.combine(end_date + timedelta(days=1), time.min)
+
+    return filters, params
+
+
+def period_range_filters(start_date: Optional[date], end_date: Optional[date]) -> Tuple[List[str], Dict[str, Any]]:
+    """Keep the `[period_start, period_end)` rows lying within inclusive calendar-day bounds.
+
+    Same days as `day_range_filters`: `period_end` is exclusive, so the
+    period covering `end_date` ends the day after it and is kept.
+    """
+    filters: List[str] = []
+    params: Dict[str, Any] = {}
+
+    if start_date is not None:
+        filters.append("period_start >= :start_date")
+        params["start_date"] = start_date
+    if end_date is not None:
+        filters.append("period_end <= :end_after")
+        params["end_after"] = end_date + timedelta(days=1)
+
+    return filters, params
+
+
+def split_values(values: Iterable[Union[int, str]]) -> List[str]:
+    """Flatten repeated and/or comma-separated query values."""
+    return [part.strip() for value in values for part in str(value).split(",") if part.strip()]
+
+
+def canonical_site_ids(values: Iterable[Union[int, str]]) -> List[int]:
+    """Sorted, de-duplicated site ids from repeated and/or comma-separated values."""
+    return sorted({int(part) for part in split_values(values)})
+
+
+def site_filters(site_ids: Optional[List[int]]) -> Tuple[List[str], Dict[str, Any]]:
+    """`site_id` predicate for a selection of sites.
+
+    A single site stays a plain equality: with `= ANY(...)` the planner
+    demotes `site_id` to a filter on the timestamp index instead of using
+    the `(site_id, <timestamp> DESC, <id> DESC)` ones in page order.
+    """
+    if not site_ids:
+        return [], {}
+    if len(site_ids) == 1:
+        return ["site_id = :site_id"], {"site_id": site_ids[0]}
+    return ["site_id = ANY(:site_ids)"], {"site_ids": list(site_ids)}
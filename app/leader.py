@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import logging
+from functools import wraps
+from time import monotonic
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.metrics import LEADER_LOCK_HELD, LEADER_LOCK_HOLD, LEADER_LOCK_WAIT
+
+logger = logging.getLogger("app.leader")
+
+ResultT = TypeVar("ResultT")
+
+
+def advisory_key(name: str) -> int:
+    """Stable signed 64-bit advisory lock key for `name`."""
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+class LeaderLease:
+    """Leadership held as a session-level Postgres advisory lock on a dedicated connection.
+
+    The lock lives as long as that connection: a leader that exits or crashes
+    releases it at once, and one whose host disappears loses it when the
+    server's TCP keepalives give up, after about `lease_seconds`. Followers
+    call `ensure` on a short heartbeat and take over on their next beat.
+
+    Those connections come from a pool-less engine on the same database:
+    closing one ends its session, so the keepalive settings never reach the
+    pool of `engine`.
+    """
+
+    def __init__(self, engine: AsyncEngine, name: str, lease_seconds: int) -> None:
+        self.engine = create_async_engine(engine.url, poolclass=NullPool)
+        self.name = name
+        self.key = advisory_key(name)
+        self.lease_seconds = lease_seconds
+        self._connection: Optional[AsyncConnection] = None
+        self._acquired_at: Optional[float] = None
+        self._waiting_since = monotonic()
+        # The heartbeat and the jobs may check the lease at the same time
+        self._guard = asyncio.Lock()
+        LEADER_LOCK_HELD.labels(lock=name).set(0)
+
+    @property
+    def is_leader(self) -> bool:
+        return self._connection is not None
+
+    async def ensure(self) -> bool:
+        """Confirm the lease is still held, or try to take it; `True` when this process is the leader."""
+        async with self._guard:
+            if self._connection is not None:
+                try:
+                    await self._connection.execute(text("SELECT 1"))
+                    return True
+                except Exception:
+                    logger.warning(
+                        "scheduler_leader_lost",
+                        exc_info=True,
+                        extra={"event": "scheduler_leader_lost", "lock": self.name},
+                    )
+                    await self._drop(unlock=False)
+            try:
+                return await self._try_acquire()
+            except Exception:
+                logger.warning(
+                    "scheduler_leader_check_failed",
+                    exc_info=True,
+                    extra={"event": "scheduler_leader_check_failed", "lock": self.name},
+                )
+                return False
+
+    async def release(self) -> None:
+        async with self._guard:
+            if self._connection is not None:
+                await self._drop(unlock=True)
+
+    async def _try_acquire(self) -> bool:
+        connection = await self.engine.connect()
+        try:
+            # Autocommit keeps the long-lived connection out of an open transaction
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            # Let the server notice a vanished leader within the lease instead of the OS default (hours)
+            probe = str(max(self.lease_seconds // 3, 1))
+            await connection.execute(
+                text(
+                    "SELECT set_config('tcp_keepalives_idle', :probe, false),"
+                    " set_config('tcp_keepalives_interval', :probe, false),"
+                    " set_config('tcp_keepalives_count', '2', false)"
+                ),
+                {"probe": probe},
+            )
+            acquired = (
+                await connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key})
+            ).scalar_one()
+        except BaseException:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+
+        self._connection = connection
+        self._acquired_at = monotonic()
+        waited = self._acquired_at - self._waiting_since
+        LEADER_LOCK_WAIT.labels(lock=self.name).observe(waited)
+        LEADER_LOCK_HELD.labels(lock=self.name).set(1)
+        logger.info(
+            "scheduler_leader_acquired",
+            extra={"event": "scheduler_leader_acquired", "lock": self.name, "duration_ms": round(waited * 1000, 2)},
+        )
+        return True
+
+    async def _drop(self, unlock: bool) -> None:
+        connection, self._connection = self._connection, None
+        held = monotonic() - (self._acquired_at or monotonic())
+        LEADER_LOCK_HOLD.labels(lock=self.name).observe(held)
+        LEADER_LOCK_HELD.labels(lock=self.name).set(0)
+        self._waiting_since = monotonic()
+        if connection is not None:
+            try:
+                if unlock:
+                    await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+                await connection.close()
+            except Exception:
+                # The lock dies with the session anyway
+                await connection.invalidate()
+        logger.info(
+            "scheduler_leader_released",
+            extra={"event": "scheduler_leader_released", "lock": self.name, "duration_ms": round(held * 1000, 2)},
+        )
+
+
+def leader_only(
+    lease: LeaderLease, job: Callable[[], Awaitable[ResultT]]
+) -> Callable[[], Awaitable[Optional[ResultT]]]:
+    """Wrap a scheduled job so it only runs on the replica holding `lease`."""
+
+    @wraps(job)
+    async def run() -> Optional[ResultT]:
+        if not await lease.ensure():
+            logger.debug("scheduler_job_skipped", extra={"event": "scheduler_job_skipped", "lock": lease.name})
+            return None
+        return await job()
+
+    return run
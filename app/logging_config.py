@@ -27,6 +27,15 @@ class JsonFormatter(logging.Formatter):
             "filters",
             "total",
             "view",
+            "route_class",
+            "statement_name",
+            "statement",
+            "parameters",
+            "rows",
+            "plan",
+            "refreshed",
+            "skipped",
+            "lock",
         ):
             value: Optional[Any] = getattr(record, key, None)
             if value is not None:
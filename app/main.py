@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import time
 import uuid
@@ -5,12 +6,18 @@ from contextlib import asynccontextmanager
 from typing import Callable
 
 from fastapi import Depends, FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi_cache import FastAPICache
+from fastapi.responses import JSONResponse, Response
 
 from app import routers
-from app.cache import init_cache
+from app.cache import cache_stats, init_cache
+from app.cache_backends import TieredBackend
+from app.compression import CompressionMiddleware
 from app.dependencies import verify_token
 from app.logging_config import configure_logging
+from app.metrics import CONTENT_TYPE_LATEST, REQUEST_LATENCY, render_metrics
+from app.settings import get_settings
+from app.versions import listen_for_versions
 
 
 logger = logging.getLogger("app.request")
@@ -20,13 +27,28 @@ logger = logging.getLogger("app.request")
 async def lifespan(app: FastAPI):
     configure_logging()
     await init_cache()
+    listeners = []
+    if get_settings().cache_version_pubsub:
+        listeners.append(asyncio.create_task(listen_for_versions()))
+    backend = FastAPICache.get_backend()
+    if isinstance(backend, TieredBackend):
+        listeners.append(asyncio.create_task(backend.listen_for_invalidations()))
     yield
+    for listener in listeners:
+        listener.cancel()
 
 
 app = FastAPI(title="Charging Analytics API", lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
 REQUEST_ID_HEADER = "X-Request-ID"
 
 
+def _route_template(request: Request) -> str:
+    # Templates rather than raw paths keep the metric label cardinality bounded
+    route = request.scope.get("route")
+    return getattr(route, "path", "<unmatched>")
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next: Callable):
     request_id = request.headers.get(REQUEST_ID_HEADER, str(uuid.uuid4()))
@@ -44,9 +66,16 @@ async def log_requests(request: Request, call_next: Callable):
                 "request_id": request_id,
             },
         )
+        REQUEST_LATENCY.labels(method=request.method, route=_route_template(request), status="500").observe(
+            time.perf_counter() - start_time
+        )
         raise
 
-    duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
+    duration = time.perf_counter() - start_time
+    duration_ms = round(duration * 1000, 2)
+    REQUEST_LATENCY.labels(
+        method=request.method, route=_route_template(request), status=str(response.status_code)
+    ).observe(duration)
 
     logger.info(
         "request_completed",
@@ -68,6 +97,7 @@ async def log_requests(request: Request, call_next: Callable):
 app.include_router(routers.kpis.router)
 app.include_router(routers.sessions.router)
 app.include_router(routers.evi.router)
+app.include_router(routers.batch.router)
 
 
 @app.get("/health")
@@ -78,3 +108,13 @@ async def healthcheck():
 @app.get("/secure-check", dependencies=[Depends(verify_token)])
 async def secure_check():
     return {"status": "authorized"}
+
+
+@app.get("/metrics", dependencies=[Depends(verify_token)], include_in_schema=False)
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/cache/stats", dependencies=[Depends(verify_token)])
+async def cache_statistics():
+    return cache_stats()
@@ -0,0 +1,103 @@
+import re
+from time import perf_counter
+from typing import Any, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Durée des requêtes HTTP par route et statut",
+    ["method", "route", "status"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Durée des requêtes SQL par nom de requête",
+    ["statement"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Résultats du cache par namespace (HIT, MISS, STALE, COALESCED, REVALIDATED)",
+    ["namespace", "result"],
+)
+ADMISSION_REJECTED = Counter(
+    "db_admission_rejected_total",
+    "Requêtes refusées faute de connexion disponible",
+    ["route_class", "status"],
+)
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Attente pour obtenir une connexion du pool",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+LEADER_LOCK_WAIT = Histogram(
+    "scheduler_leader_lock_wait_seconds",
+    "Attente d'un réplica avant d'obtenir le verrou de leader",
+    ["lock"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 900, 3600, 21600, 86400),
+)
+LEADER_LOCK_HOLD = Histogram(
+    "scheduler_leader_lock_hold_seconds",
+    "Durée de détention du verrou de leader, observée à sa libération ou à sa perte",
+    ["lock"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 900, 3600, 21600, 86400, 604800),
+)
+LEADER_LOCK_HELD = Gauge("scheduler_leader_lock_held", "1 si ce processus détient le verrou de leader", ["lock"])
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connexions actuellement empruntées au pool")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connexions ouvertes au-delà de pool_size")
+
+_STATEMENT_NAME = re.compile(r"^\s*(\w+).*?\bFROM\s+([\w.]+)", re.IGNORECASE | re.DOTALL)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long each checkout waited for a connection."""
+
+    def _do_get(self) -> Any:
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(perf_counter() - start)
+
+
+def register_pool(pool: Pool) -> None:
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        POOL_CHECKED_OUT.set_function(pool.checkedout)
+        POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
+
+
+def statement_name(statement: str, execution_options: Optional[dict] = None) -> str:
+    """`statement_name` execution option, else "<verb>:<first FROM relation>" to keep label cardinality low."""
+    if execution_options and execution_options.get("statement_name"):
+        return execution_options["statement_name"]
+    match = _STATEMENT_NAME.match(statement)
+    if match is None:
+        return statement.split(None, 1)[0].lower() if statement.strip() else "unknown"
+    return f"{match.group(1).lower()}:{match.group(2).lower()}"
+
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _observe(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        duration = perf_counter() - conn.info["query_start_time"].pop()
+        options = context.execution_options if context is not None else None
+        DB_QUERY_LATENCY.labels(statement=statement_name(statement, options)).observe(duration)
+
+    @event.listens_for(engine, "handle_error")
+    def _discard_timer(context):  # type: ignore[no-untyped-def]
+        starts = context.connection.info.get("query_start_time") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    register_pool(engine.pool)
+
+
+def render_metrics() -> bytes:
+    return generate_latest()
+
@@ -0,0 +1,198 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Optional, Sequence, Tuple, Type, TypeVar, Union
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.engine import RowMapping
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.schemas import PaginatedResponse
+from app.settings import get_settings
+
+CursorKey = Union[date, datetime]
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def encode_cursor(sort_value: CursorKey, row_id: Any) -> str:
+    payload = json.dumps({"k": sort_value.isoformat(), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[CursorKey, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        raw_key, row_id = payload["k"], payload["id"]
+        # Anything else would only fail once bound in the page query, as a server error
+        if not isinstance(raw_key, str) or not isinstance(row_id, int) or isinstance(row_id, bool):
+            raise TypeError("cursor key must be an ISO date string and id an integer")
+        sort_value: CursorKey = datetime.fromisoformat(raw_key) if "T" in raw_key else date.fromisoformat(raw_key)
+        return sort_value, row_id
+    except (binascii.Error, ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide") from exc
+
+
+def keyset_filter(sort_column: str, id_column: str, cursor: str) -> Tuple[str, Dict[str, Any]]:
+    """Build the `(sort, id) < (cursor)` predicate matching an `ORDER BY sort DESC, id DESC` listing."""
+    sort_value, row_id = decode_cursor(cursor)
+    clause = f"({sort_column}, {id_column}) < (:cursor_key, :cursor_id)"
+    return clause, {"cursor_key": sort_value, "cursor_id": row_id}
+
+
+def next_page_cursor(
+    rows: Sequence[RowMapping], page_size: int, sort_column: str, id_column: str
+) -> Optional[str]:
+    """Return the cursor of the following page when the query fetched one extra row."""
+    if len(rows) <= page_size:
+        return None
+    last = rows[page_size - 1]
+    return encode_cursor(last[sort_column], last[id_column])
+
+
+class TotalMode(str, Enum):
+    exact = "exact"
+    estimate = "estimate"
+    window = "window"
+
+
+async def count_total(
+    db: AsyncSession,
+    relation: str,
+    filter_clause: str,
+    params: Dict[str, Any],
+    include_total: bool = True,
+    mode: TotalMode = TotalMode.exact,
+    name: Optional[str] = None,
+) -> Tuple[Optional[int], bool]:
+    """Return `(total, estimated)` for a filtered listing.
+
+    In estimate mode the planner row estimate is used; small estimates are
+    confirmed with an exact count since those are cheap and the planner is
+    least reliable there. Window mode is resolved by `fetch_page` and only
+    lands here as an exact count when the page cannot carry the total.
+    `name` labels the statements instead of `relation`, for subquery relations.
+    """
+    if not include_total:
+        return None, False
+    name = name or relation
+
+    if mode is TotalMode.estimate:
+        explain_query = f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {relation} WHERE 1=1{filter_clause}"
+        explain = await db.execute(
+            text(explain_query).execution_options(statement_name=f"estimate:{name}"), params
+        )
+        plan = explain.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate >= get_settings().count_estimate_threshold:
+            return estimate, True
+
+    count_query = text(f"SELECT COUNT(*) FROM {relation} WHERE 1=1{filter_clause}")
+    count_result = await db.execute(count_query.execution_options(statement_name=f"count:{name}"), params)
+    return count_result.scalar_one_or_none() or 0, False
+
+
+@dataclass
+class Page:
+    """Raw rows of a listing plus its pagination metadata, before any serialisation."""
+
+    columns: Sequence[str]
+    rows: Sequence[RowMapping]
+    page: int
+    page_size: int
+    total: Optional[int] = None
+    total_estimated: bool = False
+    next_cursor: Optional[str] = None
+
+    def to_model(self, item_model: Type[ModelT]) -> PaginatedResponse[ModelT]:
+        return PaginatedResponse[item_model](  # type: ignore[valid-type]
+            total=self.total,
+            total_estimated=self.total_estimated,
+            page=self.page,
+            page_size=self.page_size,
+            items=[item_model(**row) for row in self.rows],
+            next_cursor=self.next_cursor,
+        )
+
+
+async def fetch_page(
+    db: AsyncSession,
+    relation: str,
+    columns: Sequence[str],
+    filter_clause: str,
+    params: Dict[str, Any],
+    sort_column: str,
+    id_column: str,
+    page: int,
+    page_size: int,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    total_mode: TotalMode = TotalMode.exact,
+    name: Optional[str] = None,
+) -> Page:
+    """Run a `ORDER BY sort DESC, id DESC` listing with offset or keyset pagination.
+
+    With `TotalMode.window` the total rides along in the page query as
+    `COUNT(*) OVER ()`, saving the second round trip. A keyset page only sees
+    rows after the cursor and an empty page carries no row, so both fall back
+    to a separate count.
+
+    Rows with a NULL sort value are left out of the listing and its total:
+    they would sort first and could neither go in a cursor nor compare below one.
+    """
+    filter_clause = f"{filter_clause} AND {sort_column} IS NOT NULL"
+    keyset_clause = ""
+    keyset_params: Dict[str, Any] = {}
+    offset = (page - 1) * page_size
+    if cursor is not None:
+        keyset, keyset_params = keyset_filter(sort_column, id_column, cursor)
+        keyset_clause = f" AND {keyset}"
+        offset = 0
+
+    use_window = include_total and total_mode is TotalMode.window and cursor is None
+    # A projection may leave out the keyset columns, which the next cursor still needs
+    select_list = ", ".join([*columns, *(column for column in (sort_column, id_column) if column not in columns)])
+    if use_window:
+        select_list += ", COUNT(*) OVER () AS total_count"
+
+    base_query = f"""
+        SELECT {select_list}
+        FROM {relation}
+        WHERE 1=1{filter_clause}{keyset_clause}
+        ORDER BY {sort_column} DESC, {id_column} DESC
+        LIMIT :limit OFFSET :offset
+    """
+
+    # One extra row tells us whether a next page exists without another query
+    params_with_pagination = {**params, **keyset_params, "limit": page_size + 1, "offset": offset}
+    result = await db.execute(
+        text(base_query).execution_options(statement_name=f"page:{name or relation}"), params_with_pagination
+    )
+    rows = result.mappings().all()
+    next_cursor = next_page_cursor(rows, page_size, sort_column, id_column)
+    rows = rows[:page_size]
+
+    if use_window and rows:
+        total: Optional[int] = rows[0]["total_count"]
+        total_estimated = False
+    else:
+        total, total_estimated = await count_total(
+            db, relation, filter_clause, params, include_total, total_mode, name
+        )
+
+    return Page(
+        columns=columns,
+        rows=rows,
+        page=page,
+        page_size=page_size,
+        total=total,
+        total_estimated=total_estimated,
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,302 @@
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from enum import Enum
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.filters import SESSION_FAILED, day_range_filters, site_filters
+from app.settings import get_settings
+
+logger = logging.getLogger("app.rollups")
+
+HOURLY_ROLLUP = "kpi_hourly"
+WATERMARKS_TABLE = "kpi_rollup_watermarks"
+ROLLUP_COLUMNS = (
+    "site_id",
+    "period_start",
+    "period_end",
+    "session_count",
+    "total_energy_kwh",
+    "average_session_kwh",
+    "total_session_hours",
+)
+
+
+PDC_DAILY_COLUMNS = (
+    "site_id",
+    "pdc",
+    "period_start",
+    "period_end",
+    "session_count",
+    "ok_count",
+    "nok_count",
+    "success_rate",
+    "total_energy_kwh",
+)
+ERRORS_DAILY_COLUMNS = ("site_id", "period_start", "period_end", "type_erreur", "moment", "nok_count")
+
+
+class Granularity(str, Enum):
+    hour = "hour"
+    day = "day"
+    week = "week"
+    month = "month"
+
+
+# Only ever interpolated from the enum, never from user input
+BUCKET_INTERVALS = {
+    Granularity.hour: "1 hour",
+    Granularity.day: "1 day",
+    Granularity.week: "7 days",
+    Granularity.month: "1 month",
+}
+
+
+def rollup_relation(
+    granularity: Granularity,
+    site_ids: Optional[List[int]],
+    start_date: Optional[date],
+    end_date: Optional[date],
+) -> Tuple[str, Dict[str, Any]]:
+    """Subquery re-bucketing `kpi_hourly` at `granularity`, usable as a `fetch_page` relation.
+
+    Filters apply to the hourly buckets, so a range that cuts through a week
+    or a month yields that bucket's partial totals.
+    """
+    filters, params = site_filters(site_ids)
+    date_filters, date_params = day_range_filters("bucket_start", start_date, end_date)
+    filters.extend(date_filters)
+    params.update(date_params)
+    where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    bucket = f"DATE_TRUNC('{granularity.value}', bucket_start)"
+    relation = f"""(
+        SELECT
+            site_id,
+            {bucket} AS period_start,
+            {bucket} + INTERVAL '{BUCKET_INTERVALS[granularity]}' AS period_end,
+            SUM(session_count)::BIGINT AS session_count,
+            SUM(total_energy_kwh) AS total_energy_kwh,
+            SUM(total_energy_kwh) / NULLIF(SUM(energy_sample_count), 0) AS average_session_kwh,
+            SUM(total_session_hours) AS total_session_hours
+        FROM {HOURLY_ROLLUP}
+        {where_clause}
+        GROUP BY site_id, {bucket}
+    ) AS rollup"""
+    return relation, params
+
+
+_SESSION_HOURS = "EXTRACT(EPOCH FROM (COALESCE(ended_at, started_at) - started_at)) / 3600"
+# Same OK rule as /sessions/stats
+_OK = f"NOT ({SESSION_FAILED})"
+
+
+@dataclass(frozen=True)
+class Rollup:
+    """A per-site rollup table of sessions, keyed by `(site_id, <key>, *dimensions)`, bucketed by `DATE_TRUNC(unit)`."""
+
+    table: str
+    unit: str
+    key: str
+    # Starts with site_id and `key`; `{bucket}` in the matching select expressions is the truncated start
+    columns: Tuple[str, ...]
+    expressions: Tuple[str, ...]
+    # Extra text grouping columns, stored as '' when missing so they can be part of the unique key
+    dimensions: Tuple[str, ...] = ()
+    # Extra predicate on the sessions aggregated
+    condition: str = ""
+
+
+def _period_rollup(table: str, unit: str, interval: str) -> Rollup:
+    # Same columns and definitions as the kpi_daily / kpi_weekly materialized views
+    return Rollup(
+        table=table,
+        unit=unit,
+        key="period_start",
+        columns=ROLLUP_COLUMNS,
+        expressions=(
+            "site_id",
+            "{bucket}::date",
+            f"({{bucket}} + INTERVAL '{interval}')::date",
+            "COUNT(*)",
+            "COALESCE(SUM(energy_kwh), 0)",
+            "AVG(energy_kwh)",
+            f"SUM({_SESSION_HOURS})",
+        ),
+    )
+
+
+ROLLUPS = (
+    Rollup(
+        table=HOURLY_ROLLUP,
+        unit="hour",
+        key="bucket_start",
+        columns=(
+            "site_id",
+            "bucket_start",
+            "session_count",
+            "total_energy_kwh",
+            "energy_sample_count",
+            "total_session_hours",
+        ),
+        expressions=(
+            "site_id",
+            "{bucket}",
+            "COUNT(*)",
+            "COALESCE(SUM(energy_kwh), 0)",
+            "COUNT(energy_kwh)",
+            f"COALESCE(SUM({_SESSION_HOURS}), 0)",
+        ),
+    ),
+    _period_rollup("kpi_daily_rollup", "day", "1 day"),
+    _period_rollup("kpi_weekly_rollup", "week", "7 days"),
+    Rollup(
+        table="kpi_pdc_daily",
+        unit="day",
+        key="period_start",
+        columns=(
+            "site_id",
+            "period_start",
+            "period_end",
+            "session_count",
+            "ok_count",
+            "nok_count",
+            "total_energy_kwh",
+            "pdc",
+        ),
+        expressions=(
+            "site_id",
+            "{bucket}::date",
+            "({bucket} + INTERVAL '1 day')::date",
+            "COUNT(*)",
+            f"COUNT(*) FILTER (WHERE {_OK})",
+            f"COUNT(*) FILTER (WHERE NOT {_OK})",
+            "COALESCE(SUM(energy_kwh), 0)",
+            "COALESCE(pdc, '')",
+        ),
+        dimensions=("pdc",),
+    ),
+    Rollup(
+        table="kpi_errors_daily",
+        unit="day",
+        key="period_start",
+        columns=ERRORS_DAILY_COLUMNS,
+        expressions=(
+            "site_id",
+            "{bucket}::date",
+            "({bucket} + INTERVAL '1 day')::date",
+            "COALESCE(type_erreur, '')",
+            "COALESCE(moment, '')",
+            "COUNT(*)",
+        ),
+        dimensions=("type_erreur", "moment"),
+        condition=f"NOT {_OK}",
+    ),
+)
+
+# Incrementally maintained tables standing in for the materialized views
+VIEW_ROLLUPS = {"kpi_daily": "kpi_daily_rollup", "kpi_weekly": "kpi_weekly_rollup"}
+
+
+def aggregate_relation(view_name: str) -> str:
+    """Relation serving a KPI view: its rollup table in incremental mode, the materialized view otherwise."""
+    return VIEW_ROLLUPS[view_name] if get_settings().kpi_rollup_incremental else view_name
+
+
+def _changed_buckets(bucket: str) -> str:
+    return f"""
+        SELECT DISTINCT site_id, {bucket}
+        FROM sessions
+        WHERE started_at >= :since AND site_id IS NOT NULL
+    """
+
+
+def _upsert_statement(rollup: Rollup, incremental: bool) -> str:
+    bucket = f"DATE_TRUNC('{rollup.unit}', started_at)"
+    select_list = ", ".join(expression.format(bucket=bucket) for expression in rollup.expressions)
+    conditions = ["site_id IS NOT NULL"]
+    if rollup.condition:
+        conditions.append(rollup.condition)
+    if incremental:
+        # Whole buckets are recomputed, including their sessions older than :since
+        conditions.append(f"started_at >= DATE_TRUNC('{rollup.unit}', CAST(:since AS TIMESTAMP))")
+        conditions.append(f"(site_id, {bucket}) IN ({_changed_buckets(bucket)})")
+    group_by = ["site_id", bucket, *(f"COALESCE({dimension}, '')" for dimension in rollup.dimensions)]
+    conflict = ("site_id", rollup.key, *rollup.dimensions)
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in rollup.columns if column not in conflict)
+    return f"""
+        INSERT INTO {rollup.table} ({", ".join(rollup.columns)})
+        SELECT {select_list}
+        FROM sessions
+        WHERE {" AND ".join(conditions)}
+        GROUP BY {", ".join(group_by)}
+        ON CONFLICT ({", ".join(conflict)}) DO UPDATE SET {updates}
+    """
+
+
+def _delete_statement(rollup: Rollup) -> str:
+    # Groups can vanish from a recomputed bucket (a failure fixed, a PDC renamed): clear the bucket first
+    bucket = f"DATE_TRUNC('{rollup.unit}', started_at)"
+    key = rollup.expressions[1].format(bucket=bucket)
+    return f"""
+        DELETE FROM {rollup.table}
+        WHERE (site_id, {rollup.key}) IN ({_changed_buckets(key)})
+    """
+
+
+async def refresh_rollup(connection: AsyncConnection, rollup: Rollup) -> int:
+    """Re-aggregate and upsert the buckets touched since the rollup's watermark, inside the caller's transaction.
+
+    The watermark is the latest `sessions.started_at` already folded in. Each
+    run goes back `kpi_rollup_lookback_minutes` before it so sessions written
+    late or updated after they started (end time, energy) are picked up. The
+    first run, with no watermark yet, aggregates the whole table. Buckets
+    whose sessions were all deleted are left as they are.
+    """
+    start = perf_counter()
+    current = await connection.execute(
+        text(f"SELECT watermark FROM {WATERMARKS_TABLE} WHERE rollup = :rollup FOR UPDATE"),
+        {"rollup": rollup.table},
+    )
+    watermark: Optional[datetime] = current.scalar_one_or_none()
+    high = (await connection.execute(text("SELECT MAX(started_at) FROM sessions"))).scalar_one()
+    if high is None:
+        return 0
+
+    settings = get_settings()
+    params: Dict[str, Any] = {}
+    if watermark is not None:
+        params["since"] = watermark - timedelta(minutes=settings.kpi_rollup_lookback_minutes)
+        if rollup.dimensions:
+            await connection.execute(text(_delete_statement(rollup)), params)
+    result = await connection.execute(
+        text(_upsert_statement(rollup, watermark is not None)).execution_options(
+            statement_name=f"rollup:{rollup.table}"
+        ),
+        params,
+    )
+    await connection.execute(
+        text(
+            f"""
+            INSERT INTO {WATERMARKS_TABLE} (rollup, watermark, updated_at)
+            VALUES (:rollup, :watermark, NOW())
+            ON CONFLICT (rollup) DO UPDATE
+            SET watermark = GREATEST({WATERMARKS_TABLE}.watermark, EXCLUDED.watermark), updated_at = NOW()
+            """
+        ),
+        {"rollup": rollup.table, "watermark": high},
+    )
+    logger.info(
+        "kpi_rollup_refreshed",
+        extra={
+            "event": "kpi_rollup_refreshed",
+            "view": rollup.table,
+            "rows": result.rowcount,
+            "duration_ms": round((perf_counter() - start) * 1000, 2),
+        },
+    )
+    return result.rowcount
@@ -1 +1 @@
-from app.routers import evi, kpis, sessions  # noqa: F401
+from app.routers import batch, evi, kpis, sessions  # noqa: F401
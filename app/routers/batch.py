@@ -0,0 +1,129 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+
+from app.admission import RouteClass
+from app.cache import cached_part
+from app.database import SessionLocal
+from app.dependencies import verify_token
+from app.filters import canonical_site_ids
+from app.pagination import Page
+from app.responses import ResponseFormat, render_page
+from app.routers.evi import _fetch_evi
+from app.routers.kpis import _fetch_aggregated_kpis, _fetch_kpis
+from app.routers.sessions import _fetch_sessions
+from app.schemas import (
+    AggregatedKpiResponse,
+    BatchDataset,
+    BatchRequest,
+    BatchResponse,
+    EviResponse,
+    KpiResponse,
+    SessionResponse,
+)
+from app.settings import get_settings
+
+router = APIRouter(prefix="/batch", tags=["batch"], dependencies=[Depends(verify_token)])
+settings = get_settings()
+
+# Page size default of the GET list endpoints, left out of cache keys like any unsent parameter
+_GET_PAGE_SIZE = 50
+
+
+@dataclass(frozen=True)
+class _Dataset:
+    namespace: str
+    source: str
+    expire: int
+    path: str
+    item_model: type
+    fetch: Callable[..., Awaitable[Page]]
+
+
+DATASETS: Dict[BatchDataset, _Dataset] = {
+    BatchDataset.sessions: _Dataset(
+        "sessions", "sessions", settings.cache_ttl_sessions, "/sessions/", SessionResponse, _fetch_sessions
+    ),
+    BatchDataset.evi: _Dataset("evi", "evi_events", settings.cache_ttl_evi, "/evi/", EviResponse, _fetch_evi),
+    BatchDataset.kpis: _Dataset("kpis", "kpis", settings.cache_ttl_kpis, "/kpis/", KpiResponse, _fetch_kpis),
+    BatchDataset.kpis_daily: _Dataset(
+        "kpis_daily",
+        "kpi_daily",
+        settings.cache_ttl_kpi_daily,
+        "/kpis/daily",
+        AggregatedKpiResponse,
+        lambda db, *args: _fetch_aggregated_kpis("kpi_daily", db, *args),
+    ),
+    BatchDataset.kpis_weekly: _Dataset(
+        "kpis_weekly",
+        "kpi_weekly",
+        settings.cache_ttl_kpi_weekly,
+        "/kpis/weekly",
+        AggregatedKpiResponse,
+        lambda db, *args: _fetch_aggregated_kpis("kpi_weekly", db, *args),
+    ),
+}
+
+
+def _query_params(spec: BatchRequest, dataset: BatchDataset) -> Dict[str, str]:
+    """The query string the equivalent GET request would carry, so both share cache entries."""
+    params: Dict[str, str] = {}
+    if spec.site_ids:
+        params["site_id"] = ",".join(str(site_id) for site_id in spec.site_ids)
+    if spec.start_date is not None:
+        params["start_date"] = spec.start_date.isoformat()
+    if spec.end_date is not None:
+        params["end_date"] = spec.end_date.isoformat()
+    if spec.page_size != _GET_PAGE_SIZE:
+        params["page_size"] = str(spec.page_size)
+    if not spec.include_total:
+        params["include_total"] = "false"
+    if dataset in spec.cursors:
+        params["cursor"] = spec.cursors[dataset]
+    return params
+
+
+async def _fetch_part(spec: BatchRequest, dataset: BatchDataset) -> Tuple[BatchDataset, bytes, str]:
+    config = DATASETS[dataset]
+
+    async def compute() -> Any:
+        # One session per part so the parts run on separate pooled connections
+        async with SessionLocal() as session:
+            session.info["route_class"] = RouteClass.standard
+            page = await config.fetch(
+                session,
+                canonical_site_ids(spec.site_ids) or None,
+                spec.start_date,
+                spec.end_date,
+                1,
+                spec.page_size,
+                spec.cursors.get(dataset),
+                spec.include_total,
+            )
+        return render_page(page, config.item_model, ResponseFormat.json)
+
+    body, cache_status = await cached_part(
+        config.namespace, config.source, config.expire, config.path, _query_params(spec, dataset), compute
+    )
+    return dataset, body, cache_status
+
+
+@router.post("/", response_model=BatchResponse)
+async def fetch_batch(spec: BatchRequest) -> Response:
+    """Plusieurs jeux de données pour un même filtre, récupérés en parallèle."""
+    datasets: List[BatchDataset] = list(dict.fromkeys(spec.datasets))
+    unknown_cursors = set(spec.cursors) - set(datasets)
+    if unknown_cursors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Curseurs fournis pour des jeux non demandés : {sorted(d.value for d in unknown_cursors)}",
+        )
+
+    parts = await asyncio.gather(*(_fetch_part(spec, dataset) for dataset in datasets))
+    # Part bodies are already encoded JSON objects: splice them instead of decoding and re-encoding
+    body = b"{" + b",".join(orjson.dumps(dataset.value) + b":" + part for dataset, part, _ in parts) + b"}"
+    cache_statuses = ", ".join(f"{dataset.value}={cache_status}" for dataset, _, cache_status in parts)
+    return Response(content=body, media_type="application/json", headers={"X-Batch-Cache": cache_statuses})
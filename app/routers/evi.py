@@ -1,13 +1,17 @@
 from datetime import date
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import text
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.cache import cache_response
 from app.database import get_db
-from app.dependencies import verify_token
+from app.dependencies import fields_query, site_ids_query, verify_token
+from app.export import ExportFormat, stream_export
+from app.filters import day_range_filters, site_filters
+from app.pagination import Page, TotalMode, fetch_page
+from app.responses import ResponseFormat, negotiate_format, render_page
 from app.schemas import EviResponse, PaginatedResponse
 from app.settings import get_settings
 
@@ -15,60 +19,93 @@ router = APIRouter(prefix="/evi", tags=["evi"], dependencies=[Depends(verify_tok
 settings = get_settings()
 
 
-async def _fetch_evi(
-    db: AsyncSession,
-    site_id: Optional[int],
-    start_date: Optional[date],
-    end_date: Optional[date],
-    page: int,
-    page_size: int,
-) -> PaginatedResponse[EviResponse]:
-    filters: List[str] = []
-    params: dict = {}
+EVI_COLUMNS = ("event_id", "site_id", "occurred_at", "code", "description")
+
 
-    if site_id is not None:
-        filters.append("site_id = :site_id")
-        params["site_id"] = site_id
-    if start_date is not None:
-        filters.append("DATE(occurred_at) >= :start_date")
-        params["start_date"] = start_date
-    if end_date is not None:
-        filters.append("DATE(occurred_at) <= :end_date")
-        params["end_date"] = end_date
+def _build_filters(
+    site_ids: Optional[List[int]], start_date: Optional[date], end_date: Optional[date]
+) -> Tuple[str, dict]:
+    filters, params = site_filters(site_ids)
+    date_filters, date_params = day_range_filters("occurred_at", start_date, end_date)
+    filters.extend(date_filters)
+    params.update(date_params)
 
     filter_clause = ""
     if filters:
         filter_clause = " AND " + " AND ".join(filters)
+    return filter_clause, params
 
-    base_query = f"""
-        SELECT event_id, site_id, occurred_at, code, description
-        FROM evi_events
-        WHERE 1=1{filter_clause}
-        ORDER BY occurred_at DESC
-        LIMIT :limit OFFSET :offset
-    """
-    count_query = f"""
-        SELECT COUNT(*) FROM evi_events WHERE 1=1{filter_clause}
-    """
-
-    params_with_pagination = {**params, "limit": page_size, "offset": (page - 1) * page_size}
-    result = await db.execute(text(base_query), params_with_pagination)
-    rows = result.mappings().all()
-    count_result = await db.execute(text(count_query), params)
-    total = count_result.scalar_one_or_none() or 0
 
-    items = [EviResponse(**row) for row in rows]
-    return PaginatedResponse[EviResponse](total=total, page=page, page_size=page_size, items=items)
+async def _fetch_evi(
+    db: AsyncSession,
+    site_ids: Optional[List[int]],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    page: int,
+    page_size: int,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    total_mode: TotalMode = TotalMode.exact,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Page:
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
+    return await fetch_page(
+        db,
+        "evi_events",
+        fields or EVI_COLUMNS,
+        filter_clause,
+        params,
+        sort_column="occurred_at",
+        id_column="event_id",
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        include_total=include_total,
+        total_mode=total_mode,
+    )
 
 
 @router.get("/", response_model=PaginatedResponse[EviResponse])
-@cache_response(expire=settings.cache_ttl_evi, namespace="evi")
+@cache_response(expire=settings.cache_ttl_evi, namespace="evi", source="evi_events")
 async def list_evi(
-    site_id: Optional[int] = Query(default=None, description="Filtrer par identifiant de site"),
+    request: Request,
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
     start_date: Optional[date] = Query(default=None, description="Date de début"),
     end_date: Optional[date] = Query(default=None, description="Date de fin"),
     page: int = Query(default=1, ge=1, description="Numéro de page"),
     page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    cursor: Optional[str] = Query(default=None, description="Curseur renvoyé par next_cursor (remplace page)"),
+    include_total: bool = Query(default=True, description="Calculer le nombre total de lignes"),
+    total_mode: TotalMode = Query(
+        default=TotalMode.exact, description="Mode de calcul du total (exact, estimate, window)"
+    ),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(EVI_COLUMNS)),
+    response_format: Optional[ResponseFormat] = Query(
+        default=None, alias="format", description="Format de réponse (json, arrow, parquet)"
+    ),
     db: AsyncSession = Depends(get_db),
-) -> PaginatedResponse[EviResponse]:
-    return await _fetch_evi(db, site_id, start_date, end_date, page, page_size)
+) -> Union[PaginatedResponse[EviResponse], Response]:
+    result = await _fetch_evi(
+        db, site_ids, start_date, end_date, page, page_size, cursor, include_total, total_mode, fields
+    )
+    return render_page(result, EviResponse, negotiate_format(request, response_format))
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_evi(
+    request: Request,
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
+    start_date: Optional[date] = Query(default=None, description="Date de début"),
+    end_date: Optional[date] = Query(default=None, description="Date de fin"),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(EVI_COLUMNS)),
+    export_format: ExportFormat = Query(default=ExportFormat.ndjson, alias="format", description="Format d'export"),
+) -> StreamingResponse:
+    columns = fields or EVI_COLUMNS
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
+    query = f"""
+        SELECT {", ".join(columns)}
+        FROM evi_events
+        WHERE 1=1{filter_clause}
+        ORDER BY occurred_at DESC, event_id DESC
+    """
+    return await stream_export(request, query, params, columns, export_format, "evi")
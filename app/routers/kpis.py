@@ -1,16 +1,35 @@
 import logging
 from datetime import date
 from time import perf_counter
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import text
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.cache import cache_response
 from app.database import get_db
-from app.dependencies import verify_token
-from app.schemas import AggregatedKpiResponse, KpiResponse, PaginatedResponse
+from app.dependencies import fields_query, site_ids_query, verify_token
+from app.export import ExportFormat, stream_export
+from app.filters import period_range_filters, site_filters
+from app.pagination import Page, TotalMode, fetch_page
+from app.responses import ResponseFormat, negotiate_format, render_page
+from app.rollups import (
+    ERRORS_DAILY_COLUMNS,
+    PDC_DAILY_COLUMNS,
+    ROLLUP_COLUMNS,
+    Granularity,
+    aggregate_relation,
+    rollup_relation,
+)
+from app.schemas import (
+    AggregatedKpiResponse,
+    ErrorDailyKpiResponse,
+    KpiResponse,
+    PaginatedResponse,
+    PdcDailyKpiResponse,
+    RollupKpiResponse,
+)
 from app.settings import get_settings
 
 router = APIRouter(prefix="/kpis", tags=["kpis"], dependencies=[Depends(verify_token)])
@@ -18,48 +37,61 @@ settings = get_settings()
 logger = logging.getLogger("app.analytics")
 
 
+KPI_COLUMNS = ("id", "site_id", "metric", "value", "period_start", "period_end")
+AGGREGATED_KPI_COLUMNS = (
+    "site_id",
+    "period_start",
+    "period_end",
+    "session_count",
+    "total_energy_kwh",
+    "average_session_kwh",
+    "total_session_hours",
+)
+
+
+def _build_filters(
+    site_ids: Optional[List[int]], start_date: Optional[date], end_date: Optional[date]
+) -> Tuple[str, dict]:
+    filters, params = site_filters(site_ids)
+    period_filters, period_params = period_range_filters(start_date, end_date)
+    filters.extend(period_filters)
+    params.update(period_params)
+
+    filter_clause = ""
+    if filters:
+        filter_clause = " AND " + " AND ".join(filters)
+    return filter_clause, params
+
+
 async def _fetch_kpis(
     db: AsyncSession,
-    site_id: Optional[int],
+    site_ids: Optional[List[int]],
     start_date: Optional[date],
     end_date: Optional[date],
     page: int,
     page_size: int,
-) -> PaginatedResponse[KpiResponse]:
-    filters: List[str] = []
-    params: dict = {}
-
-    if site_id is not None:
-        filters.append("site_id = :site_id")
-        params["site_id"] = site_id
-    if start_date is not None:
-        filters.append("period_start >= :start_date")
-        params["start_date"] = start_date
-    if end_date is not None:
-        filters.append("period_end <= :end_date")
-        params["end_date"] = end_date
-
-    filter_clause = ""
-    if filters:
-        filter_clause = " AND " + " AND ".join(filters)
-
-    base_query = f"""
-        SELECT id, site_id, metric, value, period_start, period_end
-        FROM kpis
-        WHERE 1=1{filter_clause}
-        ORDER BY period_start DESC
-        LIMIT :limit OFFSET :offset
-    """
-    count_query = f"""
-        SELECT COUNT(*) FROM kpis WHERE 1=1{filter_clause}
-    """
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    total_mode: TotalMode = TotalMode.exact,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Page:
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
 
-    params_with_pagination = {**params, "limit": page_size, "offset": (page - 1) * page_size}
     start = perf_counter()
-    result = await db.execute(text(base_query), params_with_pagination)
-    rows = result.mappings().all()
-    count_result = await db.execute(text(count_query), params)
-    total = count_result.scalar_one_or_none() or 0
+    result = await fetch_page(
+        db,
+        "kpis",
+        fields or KPI_COLUMNS,
+        filter_clause,
+        params,
+        sort_column="period_start",
+        id_column="id",
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        include_total=include_total,
+        total_mode=total_mode,
+    )
     duration_ms = round((perf_counter() - start) * 1000, 2)
 
     logger.info(
@@ -67,118 +99,374 @@ async def _fetch_kpis(
         extra={
             "event": "kpi_query_completed",
             "filters": {
-                "site_id": site_id,
+                "site_ids": site_ids,
                 "start_date": start_date.isoformat() if start_date else None,
                 "end_date": end_date.isoformat() if end_date else None,
             },
-            "total": total,
+            "total": result.total,
             "duration_ms": duration_ms,
         },
     )
 
-    items = [KpiResponse(**row) for row in rows]
-    return PaginatedResponse[KpiResponse](total=total, page=page, page_size=page_size, items=items)
+    return result
 
 
 async def _fetch_aggregated_kpis(
     view_name: str,
     db: AsyncSession,
-    site_id: Optional[int],
+    site_ids: Optional[List[int]],
     start_date: Optional[date],
     end_date: Optional[date],
     page: int,
     page_size: int,
-) -> PaginatedResponse[AggregatedKpiResponse]:
-    filters: List[str] = []
-    params: dict = {}
-
-    if site_id is not None:
-        filters.append("site_id = :site_id")
-        params["site_id"] = site_id
-    if start_date is not None:
-        filters.append("period_start >= :start_date")
-        params["start_date"] = start_date
-    if end_date is not None:
-        filters.append("period_end <= :end_date")
-        params["end_date"] = end_date
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    total_mode: TotalMode = TotalMode.exact,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Page:
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
+    # site_id is the keyset tiebreaker, and a NULL never compares below the cursor; the rollups skip them too
+    filter_clause += " AND site_id IS NOT NULL"
+    relation = aggregate_relation(view_name)
 
-    filter_clause = ""
-    if filters:
-        filter_clause = " AND " + " AND ".join(filters)
+    start = perf_counter()
+    result = await fetch_page(
+        db,
+        relation,
+        fields or AGGREGATED_KPI_COLUMNS,
+        filter_clause,
+        params,
+        sort_column="period_start",
+        id_column="site_id",
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        include_total=include_total,
+        total_mode=total_mode,
+    )
+    duration_ms = round((perf_counter() - start) * 1000, 2)
 
-    base_query = f"""
-        SELECT site_id, period_start, period_end, session_count, total_energy_kwh, average_session_kwh, total_session_hours
-        FROM {view_name}
-        WHERE 1=1{filter_clause}
-        ORDER BY period_start DESC
-        LIMIT :limit OFFSET :offset
-    """
-    count_query = f"""
-        SELECT COUNT(*) FROM {view_name} WHERE 1=1{filter_clause}
-    """
+    logger.info(
+        "aggregated_kpi_query_completed",
+        extra={
+            "event": "aggregated_kpi_query_completed",
+            "view": relation,
+            "filters": {
+                "site_ids": site_ids,
+                "start_date": start_date.isoformat() if start_date else None,
+                "end_date": end_date.isoformat() if end_date else None,
+            },
+            "total": result.total,
+            "duration_ms": duration_ms,
+        },
+    )
+
+    return result
+
+
+async def _fetch_rollup(
+    granularity: Granularity,
+    db: AsyncSession,
+    site_ids: Optional[List[int]],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    page: int,
+    page_size: int,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    total_mode: TotalMode = TotalMode.exact,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Page:
+    relation, params = rollup_relation(granularity, site_ids, start_date, end_date)
+
+    start = perf_counter()
+    result = await fetch_page(
+        db,
+        relation,
+        fields or ROLLUP_COLUMNS,
+        "",
+        params,
+        sort_column="period_start",
+        id_column="site_id",
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        include_total=include_total,
+        total_mode=total_mode,
+        name=f"kpi_rollup_{granularity.value}",
+    )
+    duration_ms = round((perf_counter() - start) * 1000, 2)
+
+    logger.info(
+        "kpi_rollup_query_completed",
+        extra={
+            "event": "kpi_rollup_query_completed",
+            "view": granularity.value,
+            "filters": {
+                "site_ids": site_ids,
+                "start_date": start_date.isoformat() if start_date else None,
+                "end_date": end_date.isoformat() if end_date else None,
+            },
+            "total": result.total,
+            "duration_ms": duration_ms,
+        },
+    )
+
+    return result
 
-    params_with_pagination = {**params, "limit": page_size, "offset": (page - 1) * page_size}
+
+async def _fetch_breakdown(
+    relation: str,
+    columns: Tuple[str, ...],
+    db: AsyncSession,
+    site_ids: Optional[List[int]],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    dimension_filters: Dict[str, Optional[List[str]]],
+    page: int,
+    page_size: int,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    total_mode: TotalMode = TotalMode.exact,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Page:
+    """Page of a per-site daily rollup broken down by extra dimensions (PDC, error type, moment)."""
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
+    for column, values in dimension_filters.items():
+        if values:
+            filter_clause += f" AND {column} = ANY(:{column}_values)"
+            params[f"{column}_values"] = values
 
     start = perf_counter()
-    result = await db.execute(text(base_query), params_with_pagination)
-    rows = result.mappings().all()
-    count_result = await db.execute(text(count_query), params)
-    total = count_result.scalar_one_or_none() or 0
+    result = await fetch_page(
+        db,
+        relation,
+        fields or columns,
+        filter_clause,
+        params,
+        sort_column="period_start",
+        id_column="id",
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        include_total=include_total,
+        total_mode=total_mode,
+    )
     duration_ms = round((perf_counter() - start) * 1000, 2)
 
     logger.info(
         "aggregated_kpi_query_completed",
         extra={
             "event": "aggregated_kpi_query_completed",
-            "view": view_name,
+            "view": relation,
             "filters": {
-                "site_id": site_id,
+                "site_ids": site_ids,
                 "start_date": start_date.isoformat() if start_date else None,
                 "end_date": end_date.isoformat() if end_date else None,
+                **dimension_filters,
             },
-            "total": total,
+            "total": result.total,
             "duration_ms": duration_ms,
         },
     )
 
-    items = [AggregatedKpiResponse(**row) for row in rows]
-    return PaginatedResponse[AggregatedKpiResponse](total=total, page=page, page_size=page_size, items=items)
+    return result
 
 
 @router.get("/", response_model=PaginatedResponse[KpiResponse])
-@cache_response(expire=settings.cache_ttl_kpis, namespace="kpis")
+@cache_response(expire=settings.cache_ttl_kpis, namespace="kpis", source="kpis")
 async def list_kpis(
-    site_id: Optional[int] = Query(default=None, description="Filtrer par identifiant de site"),
+    request: Request,
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
     start_date: Optional[date] = Query(default=None, description="Date de début de la période"),
     end_date: Optional[date] = Query(default=None, description="Date de fin de la période"),
     page: int = Query(default=1, ge=1, description="Numéro de page"),
     page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    cursor: Optional[str] = Query(default=None, description="Curseur renvoyé par next_cursor (remplace page)"),
+    include_total: bool = Query(default=True, description="Calculer le nombre total de lignes"),
+    total_mode: TotalMode = Query(
+        default=TotalMode.exact, description="Mode de calcul du total (exact, estimate, window)"
+    ),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(KPI_COLUMNS)),
+    response_format: Optional[ResponseFormat] = Query(
+        default=None, alias="format", description="Format de réponse (json, arrow, parquet)"
+    ),
     db: AsyncSession = Depends(get_db),
-) -> PaginatedResponse[KpiResponse]:
-    return await _fetch_kpis(db, site_id, start_date, end_date, page, page_size)
+) -> Union[PaginatedResponse[KpiResponse], Response]:
+    result = await _fetch_kpis(
+        db, site_ids, start_date, end_date, page, page_size, cursor, include_total, total_mode, fields
+    )
+    return render_page(result, KpiResponse, negotiate_format(request, response_format))
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_kpis(
+    request: Request,
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
+    start_date: Optional[date] = Query(default=None, description="Date de début de la période"),
+    end_date: Optional[date] = Query(default=None, description="Date de fin de la période"),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(KPI_COLUMNS)),
+    export_format: ExportFormat = Query(default=ExportFormat.ndjson, alias="format", description="Format d'export"),
+) -> StreamingResponse:
+    columns = fields or KPI_COLUMNS
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
+    query = f"""
+        SELECT {", ".join(columns)}
+        FROM kpis
+        WHERE 1=1{filter_clause}
+        ORDER BY period_start DESC, id DESC
+    """
+    return await stream_export(request, query, params, columns, export_format, "kpis")
 
 
 @router.get("/daily", response_model=PaginatedResponse[AggregatedKpiResponse])
-@cache_response(expire=settings.cache_ttl_kpi_daily, namespace="kpis_daily")
+@cache_response(expire=settings.cache_ttl_kpi_daily, namespace="kpis_daily", source="kpi_daily")
 async def list_daily_kpis(
-    site_id: Optional[int] = Query(default=None, description="Filtrer par identifiant de site"),
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
     start_date: Optional[date] = Query(default=None, description="Date de début de la période"),
     end_date: Optional[date] = Query(default=None, description="Date de fin de la période"),
     page: int = Query(default=1, ge=1, description="Numéro de page"),
     page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    cursor: Optional[str] = Query(default=None, description="Curseur renvoyé par next_cursor (remplace page)"),
+    include_total: bool = Query(default=True, description="Calculer le nombre total de lignes"),
+    total_mode: TotalMode = Query(
+        default=TotalMode.exact, description="Mode de calcul du total (exact, estimate, window)"
+    ),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(AGGREGATED_KPI_COLUMNS)),
     db: AsyncSession = Depends(get_db),
-) -> PaginatedResponse[AggregatedKpiResponse]:
-    return await _fetch_aggregated_kpis("kpi_daily", db, site_id, start_date, end_date, page, page_size)
+) -> Union[PaginatedResponse[AggregatedKpiResponse], Response]:
+    result = await _fetch_aggregated_kpis(
+        "kpi_daily", db, site_ids, start_date, end_date, page, page_size, cursor, include_total, total_mode, fields
+    )
+    return render_page(result, AggregatedKpiResponse, ResponseFormat.json)
 
 
 @router.get("/weekly", response_model=PaginatedResponse[AggregatedKpiResponse])
-@cache_response(expire=settings.cache_ttl_kpi_weekly, namespace="kpis_weekly")
+@cache_response(expire=settings.cache_ttl_kpi_weekly, namespace="kpis_weekly", source="kpi_weekly")
 async def list_weekly_kpis(
-    site_id: Optional[int] = Query(default=None, description="Filtrer par identifiant de site"),
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
     start_date: Optional[date] = Query(default=None, description="Date de début de la période"),
     end_date: Optional[date] = Query(default=None, description="Date de fin de la période"),
     page: int = Query(default=1, ge=1, description="Numéro de page"),
     page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    cursor: Optional[str] = Query(default=None, description="Curseur renvoyé par next_cursor (remplace page)"),
+    include_total: bool = Query(default=True, description="Calculer le nombre total de lignes"),
+    total_mode: TotalMode = Query(
+        default=TotalMode.exact, description="Mode de calcul du total (exact, estimate, window)"
+    ),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(AGGREGATED_KPI_COLUMNS)),
     db: AsyncSession = Depends(get_db),
-) -> PaginatedResponse[AggregatedKpiResponse]:
-    return await _fetch_aggregated_kpis("kpi_weekly", db, site_id, start_date, end_date, page, page_size)
+) -> Union[PaginatedResponse[AggregatedKpiResponse], Response]:
+    result = await _fetch_aggregated_kpis(
+        "kpi_weekly", db, site_ids, start_date, end_date, page, page_size, cursor, include_total, total_mode, fields
+    )
+    return render_page(result, AggregatedKpiResponse, ResponseFormat.json)
+
+
+@router.get("/rollup", response_model=PaginatedResponse[RollupKpiResponse])
+@cache_response(expire=settings.cache_ttl_kpi_rollup, namespace="kpis_rollup", source="kpi_hourly")
+async def list_rollup_kpis(
+    request: Request,
+    granularity: Granularity = Query(default=Granularity.day, description="Granularité (hour, day, week, month)"),
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
+    start_date: Optional[date] = Query(default=None, description="Date de début de la période"),
+    end_date: Optional[date] = Query(default=None, description="Date de fin de la période"),
+    page: int = Query(default=1, ge=1, description="Numéro de page"),
+    page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    cursor: Optional[str] = Query(default=None, description="Curseur renvoyé par next_cursor (remplace page)"),
+    include_total: bool = Query(default=True, description="Calculer le nombre total de lignes"),
+    total_mode: TotalMode = Query(
+        default=TotalMode.exact, description="Mode de calcul du total (exact, estimate, window)"
+    ),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(ROLLUP_COLUMNS)),
+    response_format: Optional[ResponseFormat] = Query(
+        default=None, alias="format", description="Format de réponse (json, arrow, parquet)"
+    ),
+    db: AsyncSession = Depends(get_db),
+) -> Union[PaginatedResponse[RollupKpiResponse], Response]:
+    """Sessions agrégées par site et par heure, jour, semaine ou mois, à partir de kpi_hourly."""
+    result = await _fetch_rollup(
+        granularity, db, site_ids, start_date, end_date, page, page_size, cursor, include_total, total_mode, fields
+    )
+    return render_page(result, RollupKpiResponse, negotiate_format(request, response_format))
+
+
+@router.get("/pdc-daily", response_model=PaginatedResponse[PdcDailyKpiResponse])
+@cache_response(expire=settings.cache_ttl_kpi_rollup, namespace="kpis_pdc_daily", source="kpi_pdc_daily")
+async def list_pdc_daily_kpis(
+    request: Request,
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
+    pdcs: Optional[List[str]] = Query(default=None, alias="pdc", description="PDC à inclure (répétable)"),
+    start_date: Optional[date] = Query(default=None, description="Date de début de la période"),
+    end_date: Optional[date] = Query(default=None, description="Date de fin de la période"),
+    page: int = Query(default=1, ge=1, description="Numéro de page"),
+    page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    cursor: Optional[str] = Query(default=None, description="Curseur renvoyé par next_cursor (remplace page)"),
+    include_total: bool = Query(default=True, description="Calculer le nombre total de lignes"),
+    total_mode: TotalMode = Query(
+        default=TotalMode.exact, description="Mode de calcul du total (exact, estimate, window)"
+    ),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(PDC_DAILY_COLUMNS)),
+    response_format: Optional[ResponseFormat] = Query(
+        default=None, alias="format", description="Format de réponse (json, arrow, parquet)"
+    ),
+    db: AsyncSession = Depends(get_db),
+) -> Union[PaginatedResponse[PdcDailyKpiResponse], Response]:
+    """Sessions OK/NOK et taux de réussite par site, PDC et jour."""
+    result = await _fetch_breakdown(
+        "kpi_pdc_daily",
+        PDC_DAILY_COLUMNS,
+        db,
+        site_ids,
+        start_date,
+        end_date,
+        {"pdc": pdcs},
+        page,
+        page_size,
+        cursor,
+        include_total,
+        total_mode,
+        fields,
+    )
+    return render_page(result, PdcDailyKpiResponse, negotiate_format(request, response_format))
+
+
+@router.get("/errors-daily", response_model=PaginatedResponse[ErrorDailyKpiResponse])
+@cache_response(expire=settings.cache_ttl_kpi_rollup, namespace="kpis_errors_daily", source="kpi_errors_daily")
+async def list_errors_daily_kpis(
+    request: Request,
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
+    types: Optional[List[str]] = Query(default=None, alias="type_erreur", description="Types d'erreur retenus"),
+    moments: Optional[List[str]] = Query(default=None, alias="moment", description="Moments d'erreur retenus"),
+    start_date: Optional[date] = Query(default=None, description="Date de début de la période"),
+    end_date: Optional[date] = Query(default=None, description="Date de fin de la période"),
+    page: int = Query(default=1, ge=1, description="Numéro de page"),
+    page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    cursor: Optional[str] = Query(default=None, description="Curseur renvoyé par next_cursor (remplace page)"),
+    include_total: bool = Query(default=True, description="Calculer le nombre total de lignes"),
+    total_mode: TotalMode = Query(
+        default=TotalMode.exact, description="Mode de calcul du total (exact, estimate, window)"
+    ),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(ERRORS_DAILY_COLUMNS)),
+    response_format: Optional[ResponseFormat] = Query(
+        default=None, alias="format", description="Format de réponse (json, arrow, parquet)"
+    ),
+    db: AsyncSession = Depends(get_db),
+) -> Union[PaginatedResponse[ErrorDailyKpiResponse], Response]:
+    """Sessions en échec par site, jour, type d'erreur et moment."""
+    result = await _fetch_breakdown(
+        "kpi_errors_daily",
+        ERRORS_DAILY_COLUMNS,
+        db,
+        site_ids,
+        start_date,
+        end_date,
+        {"type_erreur": types, "moment": moments},
+        page,
+        page_size,
+        cursor,
+        include_total,
+        total_mode,
+        fields,
+    )
+    return render_page(result, ErrorDailyKpiResponse, negotiate_format(request, response_format))
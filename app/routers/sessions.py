@@ -1,74 +1,240 @@
 from datetime import date
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.cache import cache_response
 from app.database import get_db
-from app.dependencies import verify_token
-from app.schemas import PaginatedResponse, SessionResponse
+from app.dependencies import fields_query, site_ids_query, verify_token
+from app.export import ExportFormat, stream_export
+from app.filters import SESSION_FAILED, day_range_filters, site_filters
+from app.pagination import Page, TotalMode, fetch_page
+from app.responses import ResponseFormat, negotiate_format, render_page
+from app.schemas import (
+    ErrorTypeSessionStats,
+    MomentGroupSessionStats,
+    MomentSessionStats,
+    PaginatedResponse,
+    SessionResponse,
+    SessionStatsResponse,
+    SiteSessionStats,
+)
 from app.settings import get_settings
 
 router = APIRouter(prefix="/sessions", tags=["sessions"], dependencies=[Depends(verify_token)])
 settings = get_settings()
 
 
+SESSION_COLUMNS = ("session_id", "site_id", "started_at", "ended_at", "status", "energy_kwh")
+# The dashboard's moment_avancee (analyses/kpi_sql.py)
+MOMENT_GROUP = """
+    CASE
+        WHEN moment IN ('Init', 'Lock Connector', 'CableCheck') THEN 'Avant charge'
+        WHEN moment = 'Charge' THEN 'Charge'
+        WHEN moment = 'Fin de charge' THEN 'Fin de charge'
+        ELSE 'Unknown'
+    END
+"""
+
+
+def _build_filters(
+    site_ids: Optional[List[int]], start_date: Optional[date], end_date: Optional[date]
+) -> Tuple[str, dict]:
+    filters, params = site_filters(site_ids)
+    date_filters, date_params = day_range_filters("started_at", start_date, end_date)
+    filters.extend(date_filters)
+    params.update(date_params)
+
+    filter_clause = ""
+    if filters:
+        filter_clause = " AND " + " AND ".join(filters)
+    return filter_clause, params
+
+
 async def _fetch_sessions(
     db: AsyncSession,
-    site_id: Optional[int],
+    site_ids: Optional[List[int]],
     start_date: Optional[date],
     end_date: Optional[date],
     page: int,
     page_size: int,
-) -> PaginatedResponse[SessionResponse]:
-    filters: List[str] = []
-    params: dict = {}
-
-    if site_id is not None:
-        filters.append("site_id = :site_id")
-        params["site_id"] = site_id
-    if start_date is not None:
-        filters.append("DATE(started_at) >= :start_date")
-        params["start_date"] = start_date
-    if end_date is not None:
-        filters.append("DATE(started_at) <= :end_date")
-        params["end_date"] = end_date
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    total_mode: TotalMode = TotalMode.exact,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Page:
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
+    return await fetch_page(
+        db,
+        "sessions",
+        fields or SESSION_COLUMNS,
+        filter_clause,
+        params,
+        sort_column="started_at",
+        id_column="session_id",
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        include_total=include_total,
+        total_mode=total_mode,
+    )
 
-    filter_clause = ""
-    if filters:
-        filter_clause = " AND " + " AND ".join(filters)
 
-    base_query = f"""
-        SELECT session_id, site_id, started_at, ended_at, status, energy_kwh
-        FROM sessions
-        WHERE 1=1{filter_clause}
-        ORDER BY started_at DESC
-        LIMIT :limit OFFSET :offset
+@router.get("/", response_model=PaginatedResponse[SessionResponse])
+@cache_response(expire=settings.cache_ttl_sessions, namespace="sessions", source="sessions")
+async def list_sessions(
+    request: Request,
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
+    start_date: Optional[date] = Query(default=None, description="Date de début"),
+    end_date: Optional[date] = Query(default=None, description="Date de fin"),
+    page: int = Query(default=1, ge=1, description="Numéro de page"),
+    page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    cursor: Optional[str] = Query(default=None, description="Curseur renvoyé par next_cursor (remplace page)"),
+    include_total: bool = Query(default=True, description="Calculer le nombre total de lignes"),
+    total_mode: TotalMode = Query(
+        default=TotalMode.exact, description="Mode de calcul du total (exact, estimate, window)"
+    ),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(SESSION_COLUMNS)),
+    response_format: Optional[ResponseFormat] = Query(
+        default=None, alias="format", description="Format de réponse (json, arrow, parquet)"
+    ),
+    db: AsyncSession = Depends(get_db),
+) -> Union[PaginatedResponse[SessionResponse], Response]:
+    result = await _fetch_sessions(
+        db, site_ids, start_date, end_date, page, page_size, cursor, include_total, total_mode, fields
+    )
+    return render_page(result, SessionResponse, negotiate_format(request, response_format))
+
+
+def _success_rate(ok: int, total: int) -> float:
+    return round(ok / total * 100, 2) if total else 0.0
+
+
+async def _fetch_session_stats(
+    db: AsyncSession,
+    site_ids: Optional[List[int]],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    types: Optional[List[str]],
+    moments: Optional[List[str]],
+) -> SessionStatsResponse:
+    """OK/NOK counts per site plus NOK breakdowns per moment, moment group and error type, in one scan.
+
+    Mirrors the dashboard rule: a failed session only counts as NOK when it
+    matches the type and moment filters; every other session counts as OK.
     """
-    count_query = f"""
-        SELECT COUNT(*) FROM sessions WHERE 1=1{filter_clause}
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
+
+    nok_conditions = [f"({SESSION_FAILED})"]
+    if types:
+        nok_conditions.append("type_erreur = ANY(:types)")
+        params["types"] = types
+    if moments:
+        nok_conditions.append("moment = ANY(:moments)")
+        params["moments"] = moments
+
+    query = f"""
+        SELECT
+            site_id,
+            moment,
+            moment_avancee,
+            type_erreur,
+            GROUPING(moment) AS all_moments,
+            GROUPING(moment_avancee) AS all_moment_groups,
+            GROUPING(type_erreur) AS all_types,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE nok) AS nok
+        FROM (
+            SELECT
+                site_id,
+                moment,
+                {MOMENT_GROUP} AS moment_avancee,
+                type_erreur,
+                COALESCE({" AND ".join(nok_conditions)}, FALSE) AS nok
+            FROM sessions
+            WHERE 1=1{filter_clause}
+        ) AS filtered
+        GROUP BY GROUPING SETS ((site_id), (site_id, moment), (site_id, moment_avancee), (site_id, type_erreur))
+        ORDER BY site_id
     """
+    result = await db.execute(text(query).execution_options(statement_name="sessions_stats"), params)
 
-    params_with_pagination = {**params, "limit": page_size, "offset": (page - 1) * page_size}
-    result = await db.execute(text(base_query), params_with_pagination)
-    rows = result.mappings().all()
-    count_result = await db.execute(text(count_query), params)
-    total = count_result.scalar_one_or_none() or 0
+    by_site: List[SiteSessionStats] = []
+    by_moment: List[MomentSessionStats] = []
+    by_moment_group: List[MomentGroupSessionStats] = []
+    by_type: List[ErrorTypeSessionStats] = []
+    for row in result.mappings():
+        if row["all_moments"] and row["all_moment_groups"] and row["all_types"]:
+            ok = row["total"] - row["nok"]
+            by_site.append(
+                SiteSessionStats(
+                    site_id=row["site_id"],
+                    total=row["total"],
+                    ok=ok,
+                    nok=row["nok"],
+                    success_rate=_success_rate(ok, row["total"]),
+                )
+            )
+        elif not row["nok"]:
+            continue
+        elif not row["all_moments"]:
+            by_moment.append(MomentSessionStats(site_id=row["site_id"], moment=row["moment"], nok=row["nok"]))
+        elif not row["all_moment_groups"]:
+            by_moment_group.append(
+                MomentGroupSessionStats(
+                    site_id=row["site_id"], moment_avancee=row["moment_avancee"], nok=row["nok"]
+                )
+            )
+        else:
+            by_type.append(
+                ErrorTypeSessionStats(site_id=row["site_id"], type_erreur=row["type_erreur"], nok=row["nok"])
+            )
 
-    items = [SessionResponse(**row) for row in rows]
-    return PaginatedResponse[SessionResponse](total=total, page=page, page_size=page_size, items=items)
+    total = sum(site.total for site in by_site)
+    ok = sum(site.ok for site in by_site)
+    return SessionStatsResponse(
+        total=total,
+        ok=ok,
+        nok=total - ok,
+        success_rate=_success_rate(ok, total),
+        by_site=by_site,
+        by_moment=by_moment,
+        by_moment_group=by_moment_group,
+        by_type=by_type,
+    )
 
 
-@router.get("/", response_model=PaginatedResponse[SessionResponse])
-@cache_response(expire=settings.cache_ttl_sessions, namespace="sessions")
-async def list_sessions(
-    site_id: Optional[int] = Query(default=None, description="Filtrer par identifiant de site"),
+@router.get("/stats", response_model=SessionStatsResponse)
+@cache_response(expire=settings.cache_ttl_sessions, namespace="sessions_stats", source="sessions")
+async def session_stats(
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
     start_date: Optional[date] = Query(default=None, description="Date de début"),
     end_date: Optional[date] = Query(default=None, description="Date de fin"),
-    page: int = Query(default=1, ge=1, description="Numéro de page"),
-    page_size: int = Query(default=50, ge=1, le=500, description="Taille de la page"),
+    types: Optional[List[str]] = Query(default=None, alias="type_erreur", description="Types d'erreur retenus"),
+    moments: Optional[List[str]] = Query(default=None, alias="moment", description="Moments d'erreur retenus"),
     db: AsyncSession = Depends(get_db),
-) -> PaginatedResponse[SessionResponse]:
-    return await _fetch_sessions(db, site_id, start_date, end_date, page, page_size)
+) -> SessionStatsResponse:
+    return await _fetch_session_stats(db, site_ids, start_date, end_date, types, moments)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_sessions(
+    request: Request,
+    site_ids: Optional[List[int]] = Depends(site_ids_query),
+    start_date: Optional[date] = Query(default=None, description="Date de début"),
+    end_date: Optional[date] = Query(default=None, description="Date de fin"),
+    fields: Optional[Tuple[str, ...]] = Depends(fields_query(SESSION_COLUMNS)),
+    export_format: ExportFormat = Query(default=ExportFormat.ndjson, alias="format", description="Format d'export"),
+) -> StreamingResponse:
+    columns = fields or SESSION_COLUMNS
+    filter_clause, params = _build_filters(site_ids, start_date, end_date)
+    query = f"""
+        SELECT {", ".join(columns)}
+        FROM sessions
+        WHERE 1=1{filter_clause}
+        ORDER BY started_at DESC, session_id DESC
+    """
+    return await stream_export(request, query, params, columns, export_format, "sessions")
@@ -1,7 +1,8 @@
 from datetime import date, datetime
-from typing import Generic, List, Optional, TypeVar
+from enum import Enum
+from typing import Dict, Generic, List, Optional, TypeVar
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class KpiResponse(BaseModel):
@@ -23,6 +24,37 @@ class AggregatedKpiResponse(BaseModel):
     total_session_hours: float | None = None
 
 
+class RollupKpiResponse(BaseModel):
+    site_id: int
+    period_start: datetime
+    period_end: datetime
+    session_count: int
+    total_energy_kwh: float
+    average_session_kwh: float | None = None
+    total_session_hours: float
+
+
+class PdcDailyKpiResponse(BaseModel):
+    site_id: int
+    pdc: str
+    period_start: date
+    period_end: date
+    session_count: int
+    ok_count: int
+    nok_count: int
+    success_rate: float
+    total_energy_kwh: float
+
+
+class ErrorDailyKpiResponse(BaseModel):
+    site_id: int
+    period_start: date
+    period_end: date
+    type_erreur: str
+    moment: str
+    nok_count: int
+
+
 class SessionResponse(BaseModel):
     session_id: Optional[int] = None
     site_id: Optional[int] = None
@@ -32,6 +64,43 @@ class SessionResponse(BaseModel):
     energy_kwh: Optional[float] = None
 
 
+class SiteSessionStats(BaseModel):
+    site_id: Optional[int] = None
+    total: int
+    ok: int
+    nok: int
+    success_rate: float
+
+
+class MomentSessionStats(BaseModel):
+    site_id: Optional[int] = None
+    moment: Optional[str] = None
+    nok: int
+
+
+class MomentGroupSessionStats(BaseModel):
+    site_id: Optional[int] = None
+    moment_avancee: str
+    nok: int
+
+
+class ErrorTypeSessionStats(BaseModel):
+    site_id: Optional[int] = None
+    type_erreur: Optional[str] = None
+    nok: int
+
+
+class SessionStatsResponse(BaseModel):
+    total: int
+    ok: int
+    nok: int
+    success_rate: float
+    by_site: List[SiteSessionStats]
+    by_moment: List[MomentSessionStats]
+    by_moment_group: List[MomentGroupSessionStats]
+    by_type: List[ErrorTypeSessionStats]
+
+
 class EviResponse(BaseModel):
     event_id: Optional[int] = None
     site_id: Optional[int] = None
@@ -44,7 +113,35 @@ type ItemT = TypeVar("ItemT", bound=BaseModel)
 
 
 class PaginatedResponse(BaseModel, Generic[ItemT]):
-    total: int
+    total: Optional[int] = None
+    total_estimated: bool = False
     page: int
     page_size: int
     items: List[ItemT]
+    next_cursor: Optional[str] = None
+
+
+class BatchDataset(str, Enum):
+    sessions = "sessions"
+    evi = "evi"
+    kpis = "kpis"
+    kpis_daily = "kpis_daily"
+    kpis_weekly = "kpis_weekly"
+
+
+class BatchRequest(BaseModel):
+    datasets: List[BatchDataset] = Field(min_length=1)
+    site_ids: List[int] = Field(default_factory=list)
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    page_size: int = Field(default=500, ge=1, le=500)
+    include_total: bool = False
+    cursors: Dict[BatchDataset, str] = Field(default_factory=dict)
+
+
+class BatchResponse(BaseModel):
+    sessions: Optional[PaginatedResponse[SessionResponse]] = None
+    evi: Optional[PaginatedResponse[EviResponse]] = None
+    kpis: Optional[PaginatedResponse[KpiResponse]] = None
+    kpis_daily: Optional[PaginatedResponse[AggregatedKpiResponse]] = None
+    kpis_weekly: Optional[PaginatedResponse[AggregatedKpiResponse]] = None
@@ -1,4 +1,6 @@
 from functools import lru_cache
+from typing import Dict, Optional
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,14 +14,49 @@ class Settings(BaseSettings):
     redis_url: str = Field(alias="REDIS_URL")
     api_token: str = Field(alias="API_TOKEN")
     cache_ttl_kpis: int = Field(default=300, alias="CACHE_TTL_KPIS")
-    cache_ttl_kpi_daily: int = Field(default=900, alias="CACHE_TTL_KPI_DAILY")
-    cache_ttl_kpi_weekly: int = Field(default=1800, alias="CACHE_TTL_KPI_WEEKLY")
+    cache_ttl_kpi_daily: int = Field(default=86400, alias="CACHE_TTL_KPI_DAILY")
+    cache_ttl_kpi_weekly: int = Field(default=86400, alias="CACHE_TTL_KPI_WEEKLY")
+    cache_ttl_kpi_rollup: int = Field(default=86400, alias="CACHE_TTL_KPI_ROLLUP")
     cache_ttl_sessions: int = Field(default=300, alias="CACHE_TTL_SESSIONS")
     cache_ttl_evi: int = Field(default=300, alias="CACHE_TTL_EVI")
     pool_size: int = Field(default=5, alias="DB_POOL_SIZE")
     max_overflow: int = Field(default=10, alias="DB_MAX_OVERFLOW")
     pool_timeout: int = Field(default=30, alias="DB_POOL_TIMEOUT")
+    admission_enabled: bool = Field(default=True, alias="ADMISSION_ENABLED")
+    admission_wait_budget_seconds: float = Field(default=2.0, alias="ADMISSION_WAIT_BUDGET_SECONDS")
+    admission_export_wait_budget_seconds: float = Field(default=5.0, alias="ADMISSION_EXPORT_WAIT_BUDGET_SECONDS")
+    admission_queue_limit: int = Field(default=100, alias="ADMISSION_QUEUE_LIMIT")
+    admission_heavy_queue_limit: int = Field(default=10, alias="ADMISSION_HEAVY_QUEUE_LIMIT")
+    admission_heavy_slots: Optional[int] = Field(default=None, alias="ADMISSION_HEAVY_SLOTS")
+    admission_retry_after_seconds: int = Field(default=1, alias="ADMISSION_RETRY_AFTER_SECONDS")
+    slow_query_log_enabled: bool = Field(default=True, alias="SLOW_QUERY_LOG_ENABLED")
+    slow_query_threshold_ms: int = Field(default=500, alias="SLOW_QUERY_THRESHOLD_MS")
+    slow_query_explain_sample_rate: float = Field(default=0.1, alias="SLOW_QUERY_EXPLAIN_SAMPLE_RATE")
+    count_estimate_threshold: int = Field(default=10000, alias="COUNT_ESTIMATE_THRESHOLD")
+    json_fast_path: bool = Field(default=True, alias="JSON_FAST_PATH")
+    compression_minimum_size: int = Field(default=1024, alias="COMPRESSION_MINIMUM_SIZE")
+    compression_gzip_level: int = Field(default=6, alias="COMPRESSION_GZIP_LEVEL")
+    compression_brotli_quality: int = Field(default=5, alias="COMPRESSION_BROTLI_QUALITY")
+    compression_zstd_level: int = Field(default=3, alias="COMPRESSION_ZSTD_LEVEL")
+    export_chunk_size: int = Field(default=5000, alias="EXPORT_CHUNK_SIZE")
+    cache_l1_enabled: bool = Field(default=True, alias="CACHE_L1_ENABLED")
+    cache_l1_max_bytes: int = Field(default=64 * 1024 * 1024, alias="CACHE_L1_MAX_BYTES")
+    cache_l1_ttl_seconds: int = Field(default=30, alias="CACHE_L1_TTL_SECONDS")
+    cache_l1_namespace_ttls: Dict[str, int] = Field(default_factory=dict, alias="CACHE_L1_NAMESPACE_TTLS")
+    cache_stale_ttl: int = Field(default=300, alias="CACHE_STALE_TTL")
+    cache_lock_ttl_seconds: int = Field(default=30, alias="CACHE_LOCK_TTL_SECONDS")
+    cache_lock_wait_seconds: float = Field(default=10.0, alias="CACHE_LOCK_WAIT_SECONDS")
+    cache_version_pubsub: bool = Field(default=False, alias="CACHE_VERSION_PUBSUB")
+    conditional_max_age: int = Field(default=0, alias="CONDITIONAL_MAX_AGE")
     kpi_view_refresh_minutes: int = Field(default=60, alias="KPI_VIEW_REFRESH_MINUTES")
+    kpi_rollup_incremental: bool = Field(default=False, alias="KPI_ROLLUP_INCREMENTAL")
+    kpi_rollup_lookback_minutes: int = Field(default=1440, alias="KPI_ROLLUP_LOOKBACK_MINUTES")
+    kpi_refresh_concurrency: int = Field(default=3, alias="KPI_REFRESH_CONCURRENCY")
+    kpi_refresh_log_retention_days: int = Field(default=30, alias="KPI_REFRESH_LOG_RETENTION_DAYS")
+    scheduler_leader_lease_seconds: int = Field(default=30, alias="SCHEDULER_LEADER_LEASE_SECONDS")
+    scheduler_leader_heartbeat_seconds: int = Field(default=5, alias="SCHEDULER_LEADER_HEARTBEAT_SECONDS")
+    scheduler_metrics_port: int = Field(default=9101, alias="SCHEDULER_METRICS_PORT")
+    data_version_poll_seconds: int = Field(default=60, alias="DATA_VERSION_POLL_SECONDS")
 
 
 @lru_cache()
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import random
+from time import perf_counter
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.metrics import statement_name
+from app.settings import get_settings
+
+logger = logging.getLogger("app.slow_queries")
+
+_EXPLAIN_OPTION = "slow_query_explain"
+_MAX_LOGGED_CHARS = 2000
+
+# Plans being captured, kept referenced until they finish
+_pending_plans: "set[asyncio.Task[None]]" = set()
+
+
+def _truncate(value: Any) -> str:
+    text_value = value if isinstance(value, str) else repr(value)
+    return text_value if len(text_value) <= _MAX_LOGGED_CHARS else text_value[:_MAX_LOGGED_CHARS] + "…"
+
+
+def _explainable(statement: str) -> bool:
+    # ANALYZE runs the statement again: only ever replay reads
+    return statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH")
+
+
+async def _capture_plan(engine: AsyncEngine, statement: str, parameters: Any, name: str) -> None:
+    try:
+        async with engine.connect() as connection:
+            explained = await connection.execution_options(**{_EXPLAIN_OPTION: True})
+            result = await explained.exec_driver_sql(
+                f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters
+            )
+            plan = result.scalar_one()
+            await connection.rollback()
+    except Exception:
+        logger.warning("slow_query_explain_failed", extra={"event": "slow_query_explain_failed"}, exc_info=True)
+        return
+    logger.warning(
+        "slow_query_plan",
+        extra={
+            "event": "slow_query_plan",
+            "statement_name": name,
+            "plan": json.loads(plan) if isinstance(plan, str) else plan,
+        },
+    )
+
+
+def _schedule_plan(engine: AsyncEngine, statement: str, parameters: Any, name: str) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    # Never queue a replay behind live traffic
+    pool = engine.sync_engine.pool
+    if hasattr(pool, "checkedout") and pool.checkedout() >= pool.size():
+        return
+    task = loop.create_task(_capture_plan(engine, statement, parameters, name))
+    _pending_plans.add(task)
+    task.add_done_callback(_pending_plans.discard)
+
+
+def instrument_slow_queries(engine: AsyncEngine) -> None:
+    """Log statements slower than `slow_query_threshold_ms` and replay a sample under EXPLAIN ANALYZE.
+
+    The replay runs on its own pooled connection after the original statement
+    returned, so the request never waits for the plan.
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        conn.info.setdefault("slow_query_start_time", []).append(perf_counter())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _discard_timer(context):  # type: ignore[no-untyped-def]
+        starts = context.connection.info.get("slow_query_start_time") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        duration_ms = (perf_counter() - conn.info["slow_query_start_time"].pop()) * 1000
+        settings = get_settings()
+        if not settings.slow_query_log_enabled or duration_ms < settings.slow_query_threshold_ms:
+            return
+        options = context.execution_options if context is not None else {}
+        if options.get(_EXPLAIN_OPTION):
+            return
+
+        name = statement_name(statement, options)
+        rows: Optional[int] = cursor.rowcount if cursor is not None and cursor.rowcount >= 0 else None
+        logger.warning(
+            "slow_query",
+            extra={
+                "event": "slow_query",
+                "statement_name": name,
+                "statement": _truncate(" ".join(statement.split())),
+                "parameters": _truncate(parameters),
+                "rows": rows,
+                "duration_ms": round(duration_ms, 2),
+            },
+        )
+        if not executemany and _explainable(statement) and random.random() < settings.slow_query_explain_sample_rate:
+            _schedule_plan(engine, statement, parameters, name)
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from fastapi_cache import FastAPICache
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger("app.versions")
+
+# Base tables written by the ingestion side; materialized views are bumped by the refresh job
+TRACKED_TABLES = ("sessions", "evi_events", "kpis")
+TRACKED_VIEWS = ("kpi_daily", "kpi_weekly")
+# Rollup tables maintained by the same job
+TRACKED_ROLLUPS = ("kpi_hourly", "kpi_pdc_daily", "kpi_errors_daily")
+VERSION_CHANNEL = "data-version"
+
+# Filled only while `listen_for_versions` is subscribed, so it can never lag behind Redis silently
+_local_versions: Dict[str, float] = {}
+
+
+def _backend() -> Any:
+    # Versions must never be answered from a worker's in-process tier
+    backend = FastAPICache.get_backend()
+    return getattr(backend, "l2", backend)
+
+
+def _version_key(source: str) -> str:
+    return f"{FastAPICache.get_prefix()}:data-version:{source}"
+
+
+def _decode(raw: Optional[bytes]) -> Optional[float]:
+    if raw is None:
+        return None
+    try:
+        return float(raw.decode() if isinstance(raw, bytes) else raw)
+    except ValueError:
+        return None
+
+
+async def get_data_version(source: str) -> Optional[float]:
+    """Epoch seconds of the last known change of a table or view, `None` when never recorded."""
+    if source in _local_versions:
+        return _local_versions[source]
+    return _decode(await _backend().get(_version_key(source)))
+
+
+async def bump_data_version(source: str) -> float:
+    version = time.time()
+    backend = _backend()
+    await backend.set(_version_key(source), str(version).encode())
+    redis = getattr(backend, "redis", None)
+    if redis is not None:
+        await redis.publish(VERSION_CHANNEL, f"{source}={version!r}")
+    logger.info("data_version_bumped", extra={"event": "data_version_bumped", "view": source})
+    return version
+
+
+async def listen_for_versions(retry_seconds: float = 5.0) -> None:
+    """Mirror version bumps announced on pub/sub so requests skip the Redis version lookup."""
+    redis = getattr(_backend(), "redis", None)
+    if redis is None:
+        return
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(VERSION_CHANNEL)
+                # Seed after subscribing so no bump can fall between the read and the first message
+                for source in (*TRACKED_TABLES, *TRACKED_VIEWS, *TRACKED_ROLLUPS):
+                    version = _decode(await redis.get(_version_key(source)))
+                    if version is not None:
+                        _local_versions.setdefault(source, version)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    source, _, version = message["data"].decode().partition("=")
+                    _local_versions[source] = float(version)
+        except asyncio.CancelledError:
+            _local_versions.clear()
+            raise
+        except Exception:
+            _local_versions.clear()
+            logger.warning("version_listener_failed", extra={"event": "version_listener_failed"}, exc_info=True)
+            await asyncio.sleep(retry_seconds)
+
+
+async def write_counters(connection: AsyncConnection, tables: Sequence[str]) -> Dict[str, int]:
+    """Rows ever inserted, updated or deleted in each of `tables`; tables without statistics are left out.
+
+    `pg_stat_user_tables` is read from shared memory, so this never scans
+    the tables themselves.
+    """
+    result = await connection.execute(
+        text(
+            """
+            SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS changes
+            FROM pg_stat_user_tables
+            WHERE relname = ANY(:tables)
+            """
+        ),
+        {"tables": list(tables)},
+    )
+    return {row["relname"]: row["changes"] for row in result.mappings()}
+
+
+async def track_table_versions(connection: AsyncConnection) -> Dict[str, float]:
+    """Bump the version of every tracked table whose write counters moved since the last poll."""
+    backend = _backend()
+    bumped: Dict[str, float] = {}
+    for table, changes in (await write_counters(connection, TRACKED_TABLES)).items():
+        changes_key = f"{_version_key(table)}:changes"
+        if _decode(await backend.get(changes_key)) == changes:
+            continue
+        await backend.set(changes_key, str(changes).encode())
+        bumped[table] = await bump_data_version(table)
+    return bumped
@@ -0,0 +1,69 @@
+"""Compare page + total latency: sequential COUNT(*) versus `COUNT(*) OVER ()`.
+
+Runs against the database configured in DATABASE_URL, e.g.
+`python -m benchmarks.page_total --iterations 200 --site-id 3`.
+"""
+
+import argparse
+import asyncio
+import statistics
+from time import perf_counter
+from typing import Dict, List
+
+from app.database import SessionLocal, engine
+from app.pagination import TotalMode, fetch_page
+from app.routers.sessions import SESSION_COLUMNS, _build_filters
+
+
+def _percentile(samples: List[float], percentile: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(percentile / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def _run(mode: TotalMode, iterations: int, page_size: int, site_id: int | None, page: int) -> List[float]:
+    filter_clause, params = _build_filters([site_id] if site_id is not None else None, None, None)
+    durations: List[float] = []
+    async with SessionLocal() as session:
+        for _ in range(iterations):
+            start = perf_counter()
+            await fetch_page(
+                session,
+                "sessions",
+                SESSION_COLUMNS,
+                filter_clause,
+                params,
+                sort_column="started_at",
+                id_column="session_id",
+                page=page,
+                page_size=page_size,
+                total_mode=mode,
+            )
+            durations.append((perf_counter() - start) * 1000)
+    return durations
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--site-id", type=int, default=None)
+    args = parser.parse_args()
+
+    results: Dict[str, List[float]] = {}
+    for mode in (TotalMode.exact, TotalMode.window):
+        await _run(mode, max(1, args.iterations // 10), args.page_size, args.site_id, args.page)  # warm-up
+        results[mode.value] = await _run(mode, args.iterations, args.page_size, args.site_id, args.page)
+
+    print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for mode, samples in results.items():
+        print(
+            f"{mode:<10}{_percentile(samples, 50):>10.2f}{_percentile(samples, 99):>10.2f}"
+            f"{statistics.fmean(samples):>10.2f}"
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
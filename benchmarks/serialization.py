@@ -0,0 +1,53 @@
+"""Micro-benchmark of list page serialisation: Pydantic models versus the orjson fast path.
+
+Needs no database: rows are synthetic mappings shaped like `sessions`.
+`python -m benchmarks.serialization --page-sizes 50 200 500`
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from timeit import repeat
+from typing import Dict, List
+
+from app.pagination import Page
+from app.responses import page_json_bytes
+from app.routers.sessions import SESSION_COLUMNS
+from app.schemas import SessionResponse
+
+
+def _rows(count: int) -> List[Dict]:
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "session_id": index,
+            "site_id": index % 40,
+            "started_at": start + timedelta(minutes=index),
+            "ended_at": start + timedelta(minutes=index + 45),
+            "status": "ok" if index % 7 else "error",
+            "energy_kwh": index * 0.37,
+        }
+        for index in range(count)
+    ]
+
+
+def _model_path(page: Page) -> bytes:
+    # Builds the models, then lets Pydantic serialise them as FastAPI's response_model would
+    return page.to_model(SessionResponse).model_dump_json().encode("utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[50, 100, 250, 500])
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'page_size':>10}{'pydantic µs':>14}{'orjson µs':>12}{'speedup':>10}")
+    for page_size in args.page_sizes:
+        page = Page(columns=SESSION_COLUMNS, rows=_rows(page_size), page=1, page_size=page_size, total=10_000)
+        model_us = min(repeat(lambda: _model_path(page), number=args.number, repeat=5)) / args.number * 1e6
+        fast_us = min(repeat(lambda: page_json_bytes(page), number=args.number, repeat=5)) / args.number * 1e6
+        print(f"{page_size:>10}{model_us:>14.1f}{fast_us:>12.1f}{model_us / fast_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
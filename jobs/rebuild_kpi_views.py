@@ -1,57 +1,267 @@
-"""Periodic job to refresh KPI materialized views.
+"""Periodic job to refresh KPI materialized views and the rollup tables.
 
 This script can be launched as a standalone worker (e.g., `python jobs/rebuild_kpi_views.py`)
 or imported inside a process manager. The AsyncIOScheduler keeps a single job
-instance to prevent concurrent refreshes.
+instance to prevent concurrent refreshes within a process, and across
+replicas only the holder of a Postgres advisory-lock lease runs the jobs
+(see app.leader); the others take over within a heartbeat when it goes away.
+Lock wait and hold times are exported on SCHEDULER_METRICS_PORT.
+
+Data versions are published to Redis after each refresh commits, and base
+table versions are polled from the write counters, so the API can answer
+conditional requests without querying Postgres.
+
+The rollup tables are always maintained incrementally from a watermark on
+sessions. With KPI_ROLLUP_INCREMENTAL the API serves daily and weekly KPIs
+from them and the materialized views are no longer refreshed; turning it
+off falls back to the views.
+
+Each cycle skips the targets whose source has not changed since their last
+refresh, refreshes the others concurrently (KPI_REFRESH_CONCURRENCY) and
+records every outcome in kpi_refresh_log.
 """
 
 import asyncio
 import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from functools import partial
 from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from prometheus_client import start_http_server
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
 
+from app.cache import init_cache
 from app.database import engine
+from app.leader import LeaderLease, leader_only
 from app.logging_config import configure_logging
+from app.rollups import ROLLUPS, VIEW_ROLLUPS, aggregate_relation, refresh_rollup
 from app.settings import get_settings
+from app.versions import TRACKED_VIEWS, bump_data_version, track_table_versions, write_counters
 
 logger = logging.getLogger("app.jobs")
 
+REFRESH_LOG_TABLE = "kpi_refresh_log"
+LEADER_LOCK = "kpi_refresh_scheduler"
+
+
+@dataclass
+class RefreshOutcome:
+    target: str
+    status: str
+    skip_reason: Optional[str] = None
+    duration_ms: Optional[float] = None
+    row_delta: Optional[int] = None
+
+
+async def _source_changes() -> Optional[int]:
+    # Write counters of the table every view and rollup is built from
+    async with engine.connect() as connection:
+        return (await write_counters(connection, ("sessions",))).get("sessions")
+
+
+async def _last_refreshed_changes() -> Dict[str, Optional[int]]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text(
+                f"""
+                SELECT DISTINCT ON (target) target, source_changes
+                FROM {REFRESH_LOG_TABLE}
+                WHERE status = 'refreshed'
+                ORDER BY target, started_at DESC
+                """
+            )
+        )
+        return {row["target"]: row["source_changes"] for row in result.mappings()}
+
+
+async def _record(connection: AsyncConnection, outcomes: List[RefreshOutcome], changes: Optional[int]) -> None:
+    await connection.execute(
+        text(
+            f"""
+            INSERT INTO {REFRESH_LOG_TABLE} (target, status, skip_reason, duration_ms, row_delta, source_changes)
+            VALUES (:target, :status, :skip_reason, :duration_ms, :row_delta, :source_changes)
+            """
+        ),
+        [{**asdict(outcome), "source_changes": changes} for outcome in outcomes],
+    )
+
+
+async def _row_delta(connection: AsyncConnection, relation: str) -> int:
+    # Rows this transaction added to `relation` minus those it removed, from the statistics counters
+    result = await connection.execute(
+        text(
+            """
+            SELECT pg_stat_get_xact_tuples_inserted(CAST(:relation AS regclass))
+                - pg_stat_get_xact_tuples_deleted(CAST(:relation AS regclass))
+            """
+        ),
+        {"relation": relation},
+    )
+    return result.scalar_one()
+
+
+async def _refresh_target(
+    target: str, refresh: Callable[[AsyncConnection], Awaitable[int]], changes: Optional[int], limit: asyncio.Semaphore
+) -> RefreshOutcome:
+    async with limit:
+        start = perf_counter()
+        try:
+            async with engine.begin() as connection:
+                row_delta = await refresh(connection)
+                outcome = RefreshOutcome(
+                    target, "refreshed", duration_ms=round((perf_counter() - start) * 1000, 2), row_delta=row_delta
+                )
+                await _record(connection, [outcome], changes)
+        except Exception:
+            outcome = RefreshOutcome(target, "failed", duration_ms=round((perf_counter() - start) * 1000, 2))
+            logger.exception("kpi_refresh_failed", extra={"event": "kpi_refresh_failed", "view": target})
+            try:
+                async with engine.begin() as connection:
+                    await _record(connection, [outcome], changes)
+            except Exception:
+                # The database may be what failed; the other targets of the cycle still run
+                logger.exception("kpi_refresh_log_failed", extra={"event": "kpi_refresh_log_failed", "view": target})
+            return outcome
+
+    logger.info(
+        "kpi_view_refreshed",
+        extra={
+            "event": "kpi_view_refreshed",
+            "view": target,
+            "duration_ms": outcome.duration_ms,
+            "rows": outcome.row_delta,
+        },
+    )
+    return outcome
+
+
+def _refresh_view(view: str) -> Callable[[AsyncConnection], Awaitable[int]]:
+    async def refresh(connection: AsyncConnection) -> int:
+        # A concurrent refresh applies its diff as row inserts and deletes, counted for this transaction
+        await connection.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+        return await _row_delta(connection, view)
+
+    return refresh
 
-async def refresh_views() -> None:
+
+def _served_source(target: str) -> Optional[str]:
+    """Data version the API reads `target` under, `None` when the API does not currently read it."""
+    for view, table in VIEW_ROLLUPS.items():
+        if target in (view, table):
+            return view if aggregate_relation(view) == target else None
+    return target
+
+
+async def refresh_views() -> List[RefreshOutcome]:
+    """Refresh every view and rollup table whose source changed, concurrently and each in its own transaction.
+
+    Changes are detected from the write counters of `sessions`. Every target
+    gets a row in `kpi_refresh_log`, refreshed or not, and only the data
+    versions of refreshed relations the API reads are bumped, so unchanged
+    data keeps its cache entries.
+    """
     start = perf_counter()
-    views = ["kpi_daily", "kpi_weekly"]
+    settings = get_settings()
+    changes = await _source_changes()
+    last_changes = await _last_refreshed_changes()
+
+    targets: Dict[str, Callable[[AsyncConnection], Awaitable[int]]] = {}
+    skipped: List[RefreshOutcome] = []
+    for view in TRACKED_VIEWS:
+        # In incremental mode the API reads the rollup tables, so the views are left alone
+        if settings.kpi_rollup_incremental:
+            skipped.append(RefreshOutcome(view, "skipped", skip_reason="incremental_mode"))
+        else:
+            targets[view] = _refresh_view(view)
+    for rollup in ROLLUPS:
+        targets[rollup.table] = partial(refresh_rollup, rollup=rollup)
+
+    for target in list(targets):
+        # Unknown counters (stats reset, table missing from pg_stat) always refresh
+        if changes is not None and target in last_changes and last_changes[target] == changes:
+            skipped.append(RefreshOutcome(target, "skipped", skip_reason="unchanged"))
+            del targets[target]
 
+    limit = asyncio.Semaphore(max(settings.kpi_refresh_concurrency, 1))
+    outcomes = await asyncio.gather(
+        *(_refresh_target(target, refresh, changes, limit) for target, refresh in targets.items())
+    )
     async with engine.begin() as connection:
-        for view in views:
-            view_start = perf_counter()
-            await connection.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
-            duration_ms = round((perf_counter() - view_start) * 1000, 2)
-            logger.info(
-                "kpi_view_refreshed",
-                extra={"event": "kpi_view_refreshed", "view": view, "duration_ms": duration_ms},
-            )
+        if skipped:
+            await _record(connection, skipped, changes)
+        await connection.execute(
+            text(f"DELETE FROM {REFRESH_LOG_TABLE} WHERE started_at < NOW() - make_interval(days => :days)"),
+            {"days": settings.kpi_refresh_log_retention_days},
+        )
+
+    for outcome in outcomes:
+        source = _served_source(outcome.target) if outcome.status == "refreshed" else None
+        if source is not None:
+            await bump_data_version(source)
 
     logger.info(
         "kpi_views_refresh_cycle_complete",
-        extra={"event": "kpi_views_refresh_cycle_complete", "duration_ms": round((perf_counter() - start) * 1000, 2)},
+        extra={
+            "event": "kpi_views_refresh_cycle_complete",
+            "duration_ms": round((perf_counter() - start) * 1000, 2),
+            "refreshed": [outcome.target for outcome in outcomes if outcome.status == "refreshed"],
+            "skipped": {outcome.target: outcome.skip_reason for outcome in skipped},
+        },
     )
+    return [*outcomes, *skipped]
+
+
+async def poll_table_versions() -> None:
+    async with engine.connect() as connection:
+        await track_table_versions(connection)
+
+
+async def leader_heartbeat(lease: LeaderLease, scheduler: AsyncIOScheduler) -> None:
+    was_leader = lease.is_leader
+    if await lease.ensure() and not was_leader:
+        # A new leader catches up now instead of waiting for its next refresh tick
+        scheduler.modify_job("refresh_kpi_views", next_run_time=datetime.now(timezone.utc))
 
 
 async def main() -> None:
     settings = get_settings()
     configure_logging()
+    await init_cache()
+    if settings.scheduler_metrics_port:
+        start_http_server(settings.scheduler_metrics_port)
 
+    # Every replica schedules the jobs; only the one holding the lease runs them
+    lease = LeaderLease(engine, LEADER_LOCK, settings.scheduler_leader_lease_seconds)
     scheduler = AsyncIOScheduler()
     scheduler.add_job(
-        refresh_views,
+        leader_only(lease, refresh_views),
         "interval",
         minutes=settings.kpi_view_refresh_minutes,
         id="refresh_kpi_views",
         max_instances=1,
         coalesce=True,
     )
+    scheduler.add_job(
+        leader_only(lease, poll_table_versions),
+        "interval",
+        seconds=settings.data_version_poll_seconds,
+        id="poll_table_versions",
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        leader_heartbeat,
+        "interval",
+        args=(lease, scheduler),
+        seconds=settings.scheduler_leader_heartbeat_seconds,
+        id="leader_heartbeat",
+        max_instances=1,
+        coalesce=True,
+    )
     scheduler.start()
 
     logger.info(
@@ -59,11 +269,17 @@ async def main() -> None:
         extra={
             "event": "kpi_view_scheduler_started",
             "refresh_interval_minutes": settings.kpi_view_refresh_minutes,
+            "lock": LEADER_LOCK,
         },
     )
 
-    await refresh_views()  # Run once at startup for freshness
-    await asyncio.Event().wait()  # Keep the loop alive
+    try:
+        await leader_only(lease, refresh_views)()  # Run once at startup for freshness
+        await leader_only(lease, poll_table_versions)()
+        await asyncio.Event().wait()  # Keep the loop alive
+    finally:
+        scheduler.shutdown(wait=False)
+        await lease.release()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,30 @@
+-- Composite indexes backing the list endpoints and their keyset pagination.
+-- Column order matches the filters (site_id equality, timestamp range) and the
+-- `ORDER BY <timestamp> DESC, <id> DESC` used by the routers, so a filtered page
+-- is a single index range scan with no sort step.
+-- CONCURRENTLY avoids blocking writers; run these outside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sessions_site_started
+    ON sessions (site_id, started_at DESC, session_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sessions_started
+    ON sessions (started_at DESC, session_id DESC);
+
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_evi_events_site_occurred
+    ON evi_events (site_id, occurred_at DESC, event_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_evi_events_occurred
+    ON evi_events (occurred_at DESC, event_id DESC);
+
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kpis_site_period
+    ON kpis (site_id, period_start DESC, id DESC);
+
+
+-- Expected plan for a filtered page (Index Scan, no Seq Scan / Sort node):
+-- EXPLAIN SELECT session_id, site_id, started_at, ended_at, status, energy_kwh
+-- FROM sessions
+-- WHERE site_id = 1 AND started_at >= '2024-01-01' AND started_at < '2024-02-01'
+-- ORDER BY started_at DESC, session_id DESC
+-- LIMIT 51;
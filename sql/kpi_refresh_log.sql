@@ -0,0 +1,20 @@
+-- One row per view or rollup table per run of jobs/rebuild_kpi_views.py.
+-- status is 'refreshed', 'skipped' (skip_reason: 'unchanged' when the write
+-- counters of sessions did not move since the target's last refresh,
+-- 'incremental_mode' for views the API no longer reads) or 'failed'.
+-- row_delta is the change in view rows, or the rows upserted into a rollup.
+-- source_changes is the sessions write counter the run was compared against.
+CREATE TABLE IF NOT EXISTS kpi_refresh_log (
+    id BIGSERIAL PRIMARY KEY,
+    target TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    status TEXT NOT NULL,
+    skip_reason TEXT,
+    duration_ms DOUBLE PRECISION,
+    row_delta BIGINT,
+    source_changes BIGINT
+);
+
+-- Last refresh per target, and retention cleanup
+CREATE INDEX IF NOT EXISTS idx_kpi_refresh_log_target
+    ON kpi_refresh_log (target, started_at DESC);
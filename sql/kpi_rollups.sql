@@ -0,0 +1,103 @@
+-- Rollup tables maintained incrementally by jobs/rebuild_kpi_views.py
+-- (app.rollups.refresh_rollup): each run re-aggregates the (site_id, bucket)
+-- pairs touched by sessions started since the table's watermark, minus a
+-- lookback, and upserts them.
+-- Sessions are attributed to the bucket they started in, like kpi_daily/kpi_weekly.
+-- Sessions without a site are left out: every rollup row belongs to a site.
+
+-- Hourly base table re-bucketed by /kpis/rollup into hours, days, weeks or
+-- months. It stores additive measures only (sums and counts), so any coarser
+-- bucket is a plain SUM over its hours; the average energy is recomputed from
+-- total_energy_kwh / energy_sample_count.
+CREATE TABLE IF NOT EXISTS kpi_hourly (
+    site_id INTEGER NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    session_count BIGINT NOT NULL,
+    total_energy_kwh DOUBLE PRECISION NOT NULL DEFAULT 0,
+    energy_sample_count BIGINT NOT NULL DEFAULT 0,
+    total_session_hours DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (site_id, bucket_start)
+);
+
+-- Range scans over every site (no site filter)
+CREATE INDEX IF NOT EXISTS idx_kpi_hourly_bucket
+    ON kpi_hourly (bucket_start);
+
+
+-- Same columns as the kpi_daily / kpi_weekly materialized views, which stay
+-- available as a fallback (KPI_ROLLUP_INCREMENTAL=false).
+CREATE TABLE IF NOT EXISTS kpi_daily_rollup (
+    site_id INTEGER NOT NULL,
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    session_count BIGINT NOT NULL,
+    total_energy_kwh DOUBLE PRECISION NOT NULL DEFAULT 0,
+    average_session_kwh DOUBLE PRECISION,
+    total_session_hours DOUBLE PRECISION,
+    PRIMARY KEY (site_id, period_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_kpi_daily_rollup_period
+    ON kpi_daily_rollup (period_start);
+
+CREATE TABLE IF NOT EXISTS kpi_weekly_rollup (
+    site_id INTEGER NOT NULL,
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    session_count BIGINT NOT NULL,
+    total_energy_kwh DOUBLE PRECISION NOT NULL DEFAULT 0,
+    average_session_kwh DOUBLE PRECISION,
+    total_session_hours DOUBLE PRECISION,
+    PRIMARY KEY (site_id, period_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_kpi_weekly_rollup_period
+    ON kpi_weekly_rollup (period_start);
+
+
+-- Latest sessions.started_at folded into each rollup table. Delete a row to
+-- re-aggregate the whole table on the next run.
+CREATE TABLE IF NOT EXISTS kpi_rollup_watermarks (
+    rollup TEXT PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+
+-- Daily success rate per charge point. A session is OK unless its status reads
+-- as a non-zero number, as in /sessions/stats. Sessions without a PDC are
+-- grouped under ''.
+CREATE TABLE IF NOT EXISTS kpi_pdc_daily (
+    id BIGSERIAL PRIMARY KEY,
+    site_id INTEGER NOT NULL,
+    pdc TEXT NOT NULL,
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    session_count BIGINT NOT NULL,
+    ok_count BIGINT NOT NULL,
+    nok_count BIGINT NOT NULL,
+    success_rate DOUBLE PRECISION
+        GENERATED ALWAYS AS (ROUND(ok_count * 100.0 / NULLIF(session_count, 0), 2)::DOUBLE PRECISION) STORED,
+    total_energy_kwh DOUBLE PRECISION NOT NULL DEFAULT 0,
+    UNIQUE (site_id, period_start, pdc)
+);
+
+-- Keyset pagination: ORDER BY period_start DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_kpi_pdc_daily_period
+    ON kpi_pdc_daily (period_start DESC, id DESC);
+
+
+-- Daily failed sessions per error type and moment. Missing values are stored as ''.
+CREATE TABLE IF NOT EXISTS kpi_errors_daily (
+    id BIGSERIAL PRIMARY KEY,
+    site_id INTEGER NOT NULL,
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    type_erreur TEXT NOT NULL,
+    moment TEXT NOT NULL,
+    nok_count BIGINT NOT NULL,
+    UNIQUE (site_id, period_start, type_erreur, moment)
+);
+
+CREATE INDEX IF NOT EXISTS idx_kpi_errors_daily_period
+    ON kpi_errors_daily (period_start DESC, id DESC);
@@ -1,9 +1,18 @@
 import os
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
 
+import pandas as pd
+import pyarrow as pa
 import requests
 import streamlit as st
 
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MAX_VALIDATED_RESPONSES = 256
+
+# Last response per URL and Accept header, replayed when the API answers 304
+_validated_responses: "OrderedDict[str, requests.Response]" = OrderedDict()
+
 
 class ApiConfig:
     def __init__(self) -> None:
@@ -46,7 +55,7 @@ def _raise_for_status(response: requests.Response) -> None:
         raise requests.HTTPError(detail) from exc
 
 
-def api_get(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+def _get(path: str, params: Optional[Dict[str, Any]], headers: Optional[Dict[str, str]] = None) -> requests.Response:
     config = get_api_config()
     if not config.base_url:
         raise RuntimeError(
@@ -54,9 +63,48 @@ def api_get(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any
         )
 
     url = f"{config.base_url}{path}"
-    response = requests.get(url, headers=config.headers(), params=params, timeout=30)
+    request_headers = {**config.headers(), **(headers or {})}
+    prepared_url = requests.Request("GET", url, params=params).prepare().url
+    cache_key = f"{request_headers.get('Accept')} {prepared_url}"
+    previous = _validated_responses.get(cache_key)
+    if previous is not None:
+        request_headers["If-None-Match"] = previous.headers["ETag"]
+
+    response = requests.get(url, headers=request_headers, params=params, timeout=30)
+    if response.status_code == 304 and previous is not None:
+        _validated_responses.move_to_end(cache_key)
+        return previous
     _raise_for_status(response)
+
+    if response.headers.get("ETag"):
+        _validated_responses[cache_key] = response
+        _validated_responses.move_to_end(cache_key)
+        while len(_validated_responses) > MAX_VALIDATED_RESPONSES:
+            _validated_responses.popitem(last=False)
+    return response
+
+
+def api_get(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    response = _get(path, params)
     data = response.json()
     if isinstance(data, dict):
         return data
     return {"data": data}
+
+
+def api_get_frame_all(path: str, params: Optional[Dict[str, Any]] = None, max_pages: int = 1000) -> pd.DataFrame:
+    """Walk a paginated endpoint as Arrow stream pages, following `X-Next-Cursor` until exhaustion."""
+    query: Dict[str, Any] = dict(params or {})
+    query.pop("page", None)
+    tables: List[pa.Table] = []
+    for _ in range(max_pages):
+        response = _get(path, query, headers={"Accept": ARROW_MEDIA_TYPE})
+        with pa.ipc.open_stream(response.content) as reader:
+            tables.append(reader.read_all())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        query["cursor"] = next_cursor
+    if not tables:
+        return pd.DataFrame()
+    return pa.concat_tables(tables).to_pandas()
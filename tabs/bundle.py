@@ -0,0 +1,19 @@
+from datetime import date
+from typing import Any, Dict, Optional, Sequence
+
+from . import evi as evi_api
+from . import kpi as kpi_api
+
+
+def fetch_bundle(site_ids: Sequence[int], start: Optional[date], end: Optional[date]) -> Dict[str, Any]:
+    """KPI tables and EVI events for a site selection, each walked as conditional Arrow pages.
+
+    GET walks keep the Arrow transport and `If-None-Match` revalidation, so a
+    refresh of unchanged data costs one 304 per page.
+    """
+    # Selections built from pandas columns hold numpy integers, which would key separate cache entries
+    selection = tuple(sorted({int(site_id) for site_id in site_ids}))
+    return {
+        "kpis": kpi_api.fetch_kpis(selection, start, end),
+        "evi": evi_api.fetch_evi(selection, start, end),
+    }
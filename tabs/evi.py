@@ -1,36 +1,36 @@
 from datetime import date
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Tuple
 
 import pandas as pd
 import streamlit as st
 
-from .api_client import api_get, get_api_config
+from .api_client import api_get_frame_all, get_api_config
 
 
-@st.cache_data(ttl=lambda: get_api_config().cache_ttl, show_spinner=False)
-def _fetch_evi(site_id: Optional[int], start: Optional[date], end: Optional[date], cache_version: str) -> pd.DataFrame:
+@st.cache_data(ttl=get_api_config().cache_ttl, show_spinner=False)
+def _fetch_evi(
+    site_ids: Tuple[int, ...], start: Optional[date], end: Optional[date], cache_version: str
+) -> pd.DataFrame:
     params: Dict[str, Any] = {
-        "page": 1,
-        "page_size": 2000,
+        "page_size": 500,
+        "include_total": False,
         "cache_version": cache_version,
     }
-    if site_id is not None:
-        params["site_id"] = site_id
+    if site_ids:
+        params["site_id"] = list(site_ids)
     if start is not None:
         params["start_date"] = start
     if end is not None:
         params["end_date"] = end
 
-    payload = api_get("/evi", params=params)
-    items = payload.get("items") or payload.get("data") or []
-    return pd.DataFrame(items)
+    return api_get_frame_all("/evi", params=params)
 
 
-def fetch_evi(site_id: Optional[int], start: Optional[date], end: Optional[date]) -> pd.DataFrame:
+def fetch_evi(site_ids: Sequence[int], start: Optional[date], end: Optional[date]) -> pd.DataFrame:
     config = get_api_config()
     cache_version = config.cache_version
     try:
-        return _fetch_evi(site_id, start, end, cache_version)
+        return _fetch_evi(tuple(sorted(set(site_ids))), start, end, cache_version)
     except Exception as exc:  # pragma: no cover - UI feedback only
         st.error(f"Erreur lors du chargement des événements EVI : {exc}")
         return pd.DataFrame()
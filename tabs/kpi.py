@@ -1,37 +1,35 @@
 from datetime import date
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Tuple
 
 import pandas as pd
 import streamlit as st
 
-from .api_client import api_get, get_api_config
+from .api_client import api_get_frame_all, get_api_config
 
 
-@st.cache_data(ttl=lambda: get_api_config().cache_ttl, show_spinner=False)
-def _fetch_kpis(site_id: Optional[int], start: Optional[date], end: Optional[date], cache_version: str) -> Dict[str, pd.DataFrame]:
+@st.cache_data(ttl=get_api_config().cache_ttl, show_spinner=False)
+def _fetch_kpis(
+    site_ids: Tuple[int, ...], start: Optional[date], end: Optional[date], cache_version: str
+) -> Dict[str, pd.DataFrame]:
     params: Dict[str, Any] = {
-        "page": 1,
         "page_size": 500,
+        "include_total": False,
         "cache_version": cache_version,
     }
-    if site_id is not None:
-        params["site_id"] = site_id
+    if site_ids:
+        params["site_id"] = list(site_ids)
     if start is not None:
         params["start_date"] = start
     if end is not None:
         params["end_date"] = end
 
-    payload = api_get("/kpis", params=params)
-    items = payload.get("items") or payload.get("data") or []
-    df = pd.DataFrame(items)
-    return {"kpis": df}
+    return {"kpis": api_get_frame_all("/kpis", params=params)}
 
 
-def fetch_kpis(site_id: Optional[int], start: Optional[date], end: Optional[date]) -> Dict[str, pd.DataFrame]:
+def fetch_kpis(site_ids: Sequence[int], start: Optional[date], end: Optional[date]) -> Dict[str, pd.DataFrame]:
     config = get_api_config()
-    cache_version = config.cache_version
     try:
-        return _fetch_kpis(site_id, start, end, cache_version)
+        return _fetch_kpis(tuple(sorted(set(site_ids))), start, end, config.cache_version)
     except Exception as exc:  # pragma: no cover - UI feedback only
         st.error(f"Erreur lors du chargement des KPI : {exc}")
         return {"kpis": pd.DataFrame()}
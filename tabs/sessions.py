@@ -1,37 +1,101 @@
 from datetime import date
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Tuple
 
 import pandas as pd
 import streamlit as st
 
-from .api_client import api_get, get_api_config
+from .api_client import api_get, api_get_frame_all, get_api_config
 
 
-@st.cache_data(ttl=lambda: get_api_config().cache_ttl, show_spinner=False)
-def _fetch_sessions(site_id: Optional[int], start: Optional[date], end: Optional[date], cache_version: str) -> pd.DataFrame:
+@st.cache_data(ttl=get_api_config().cache_ttl, show_spinner=False)
+def _fetch_sessions(
+    site_ids: Tuple[int, ...], start: Optional[date], end: Optional[date], cache_version: str
+) -> pd.DataFrame:
     params: Dict[str, Any] = {
-        "page": 1,
-        "page_size": 2000,
+        "page_size": 500,
+        "include_total": False,
         "cache_version": cache_version,
     }
-    if site_id is not None:
-        params["site_id"] = site_id
+    if site_ids:
+        params["site_id"] = list(site_ids)
     if start is not None:
         params["start_date"] = start
     if end is not None:
         params["end_date"] = end
 
-    payload = api_get("/sessions", params=params)
-    items = payload.get("items") or payload.get("data") or []
-    df = pd.DataFrame(items)
+    df = api_get_frame_all("/sessions", params=params)
     return df
 
 
-def fetch_sessions(site_id: Optional[int], start: Optional[date], end: Optional[date]) -> pd.DataFrame:
+def fetch_sessions(site_ids: Sequence[int], start: Optional[date], end: Optional[date]) -> pd.DataFrame:
     config = get_api_config()
     cache_version = config.cache_version
     try:
-        return _fetch_sessions(site_id, start, end, cache_version)
+        return _fetch_sessions(tuple(sorted(set(site_ids))), start, end, cache_version)
     except Exception as exc:  # pragma: no cover - UI feedback only
         st.error(f"Erreur lors du chargement des sessions : {exc}")
         return pd.DataFrame()
+
+
+def empty_session_stats() -> Dict[str, Any]:
+    return {
+        "summary": {},
+        "by_site": pd.DataFrame(),
+        "by_moment": pd.DataFrame(),
+        "by_moment_group": pd.DataFrame(),
+        "by_type": pd.DataFrame(),
+    }
+
+
+@st.cache_data(ttl=get_api_config().cache_ttl, show_spinner=False)
+def _fetch_session_stats(
+    site_ids: Tuple[int, ...],
+    start: Optional[date],
+    end: Optional[date],
+    types: Tuple[str, ...],
+    moments: Tuple[str, ...],
+    cache_version: str,
+) -> Dict[str, Any]:
+    params: Dict[str, Any] = {"cache_version": cache_version}
+    if site_ids:
+        params["site_id"] = list(site_ids)
+    if start is not None:
+        params["start_date"] = start
+    if end is not None:
+        params["end_date"] = end
+    if types:
+        params["type_erreur"] = list(types)
+    if moments:
+        params["moment"] = list(moments)
+
+    payload = api_get("/sessions/stats", params=params)
+    return {
+        "summary": {key: payload.get(key) for key in ("total", "ok", "nok", "success_rate")},
+        "by_site": pd.DataFrame(payload.get("by_site") or []),
+        "by_moment": pd.DataFrame(payload.get("by_moment") or []),
+        "by_moment_group": pd.DataFrame(payload.get("by_moment_group") or []),
+        "by_type": pd.DataFrame(payload.get("by_type") or []),
+    }
+
+
+def fetch_session_stats(
+    site_ids: Sequence[int],
+    start: Optional[date],
+    end: Optional[date],
+    types: Sequence[str] = (),
+    moments: Sequence[str] = (),
+) -> Dict[str, Any]:
+    """Grouped OK/NOK aggregates computed by the API instead of pandas groupbys on raw sessions."""
+    config = get_api_config()
+    try:
+        return _fetch_session_stats(
+            tuple(sorted({int(site_id) for site_id in site_ids})),
+            start,
+            end,
+            tuple(types),
+            tuple(moments),
+            config.cache_version,
+        )
+    except Exception as exc:  # pragma: no cover - UI feedback only
+        st.error(f"Erreur lors du chargement des statistiques de sessions : {exc}")
+        return empty_session_stats()
@@ -16,37 +16,24 @@ TAB_CODE = dedent(
     c3.metric("Échec", nok)
     c4.metric("Taux de réussite", f"{taux_reussite:.2f}%")
     c5.metric("Taux d’échec", f"{taux_echec:.2f}%")
-    by_site_kpi = (
-        sess_kpi.groupby(SITE_COL, as_index=False)
-                .agg(total=("is_ok_filt", "count"),
-                    ok=("is_ok_filt", "sum"))
-    )
-
-    if not by_site_kpi.empty:
-        by_site_kpi["nok"] = by_site_kpi["total"] - by_site_kpi["ok"]
-        by_site_kpi["taux_ok"] = (by_site_kpi["ok"] / by_site_kpi["total"] * 100).round(1)
-        sites_list = by_site_kpi[SITE_COL].tolist()
     st.divider()
-    err = sess_kpi[~sess_kpi["is_ok_filt"]].copy()
-    # Vérif minimum
-    if not err.empty and "moment_avancee" in err.columns and SITE_COL in err.columns:
+    # Agrégats calculés par l'API (/sessions/stats) ; les sites sont regroupés par nom comme dans sess_kpi
+    stats_by_site = session_stats["by_site"]
+    stats_by_group = session_stats["by_moment_group"]
+    if not stats_by_group.empty and not stats_by_site.empty:
         # Erreurs par moment avancé
         err_grouped = (
-            err.groupby([SITE_COL, "moment_avancee"])
-            .size()
-            .reset_index(name="Nb")
-            .pivot(index=SITE_COL, columns="moment_avancee", values="Nb")
-            .fillna(0)
+            stats_by_group.assign(**{SITE_COL: stats_by_group["site_id"].map(site_names)})
+            .pivot_table(index=SITE_COL, columns="moment_avancee", values="nok", aggfunc="sum", fill_value=0)
             .astype(int)
             .reset_index()
         )
+        err_grouped.columns.name = None
         # Stat global : total / ok / nok
         stat_global = (
-            sess_kpi.groupby(SITE_COL)
-            .agg(
-                Total=("is_ok_filt", "count"),
-                Total_OK=("is_ok_filt", "sum"),
-            )
+            stats_by_site.assign(**{SITE_COL: stats_by_site["site_id"].map(site_names)})
+            .groupby(SITE_COL)
+            .agg(Total=("total", "sum"), Total_OK=("ok", "sum"))
             .reset_index()
         )
         stat_global["Total_NOK"] = stat_global["Total"] - stat_global["Total_OK"]
@@ -83,11 +70,13 @@ TAB_CODE = dedent(
     else:
         st.info("Aucune donnée récapitulative disponible pour ce périmètre.")
 
-    if not err.empty and "moment" in err.columns:
+    stats_by_moment = session_stats["by_moment"]
+    if not stats_by_moment.empty:
         counts_moment = (
-            err.groupby("moment")
-            .size()
+            stats_by_moment.groupby("moment")["nok"]
+            .sum()
             .reindex(MOMENT_ORDER, fill_value=0)
+            .rename_axis("moment")
             .reset_index(name="Somme de Charge_NOK")
         )
         counts_moment = counts_moment[counts_moment["Somme de Charge_NOK"] > 0]
@@ -0,0 +1,65 @@
+"""Dashboard bundle loading, with the API answered by in-process fakes instead of HTTP."""
+
+import io
+from typing import Any, Dict, List
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pa = pytest.importorskip("pyarrow")
+requests = pytest.importorskip("requests")
+st = pytest.importorskip("streamlit")
+pytest.importorskip("plotly")  # tabs/__init__ imports every tab
+
+from tabs import api_client, bundle  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, request: requests.PreparedRequest, content: bytes) -> None:
+        self.request = request
+        self.status_code = 200
+        self.headers: Dict[str, str] = {}
+        self.content = content
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+def _arrow_stream(rows: List[Dict[str, Any]]) -> bytes:
+    sink = io.BytesIO()
+    table = pa.Table.from_pylist(rows)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+@pytest.fixture
+def fake_api(monkeypatch: pytest.MonkeyPatch) -> List[requests.PreparedRequest]:
+    sent: List[requests.PreparedRequest] = []
+
+    def fake_get(url: str, headers: Dict[str, str], params: Dict[str, Any], timeout: float) -> FakeResponse:
+        # Preparing the request runs the same encoding as a real call would
+        prepared = requests.Request("GET", url, headers=headers, params=params).prepare()
+        sent.append(prepared)
+        return FakeResponse(prepared, content=_arrow_stream([{"site_id": 3, "value": 1.0}]))
+
+    monkeypatch.setenv("API_BASE_URL", "http://api.test")
+    monkeypatch.setattr(api_client.requests, "get", fake_get)
+    monkeypatch.setattr(api_client, "_validated_responses", type(api_client._validated_responses)())
+    monkeypatch.setattr(st, "error", lambda message: pytest.fail(message))
+    st.cache_data.clear()
+    return sent
+
+
+def test_numpy_site_selection_reaches_the_api(fake_api: List[requests.PreparedRequest]) -> None:
+    # As App.py builds it from the sessions frame
+    selection = tuple(np.array([5, 3, 3], dtype=np.int64))
+
+    result = bundle.fetch_bundle(site_ids=selection, start=None, end=None)
+
+    assert not result["evi"].empty
+    assert all(not table.empty for table in result["kpis"].values())
+    assert sorted(request.path_url.split("?")[0] for request in fake_api) == ["/evi", "/kpis"]
+    for request in fake_api:
+        assert request.headers["Accept"] == api_client.ARROW_MEDIA_TYPE
+        assert "site_id=3&site_id=5" in request.url
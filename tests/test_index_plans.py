@@ -0,0 +1,75 @@
+"""Plan regression checks for the list endpoint indexes (sql/indexes.sql).
+
+Run against a test database: the check briefly drops an index inside a
+transaction that is rolled back, which locks `sessions` meanwhile.
+"""
+
+import asyncio
+import json
+import os
+from datetime import date
+from typing import Any, Dict, Iterator
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL non défini")
+
+
+def _nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _nodes(child)
+
+
+async def _explain_sessions_page() -> Dict[str, Any]:
+    os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+    os.environ.setdefault("API_TOKEN", "test")
+    from sqlalchemy import event, text
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from app.routers.sessions import _fetch_sessions
+
+    engine = create_async_engine(os.environ["DATABASE_URL"], poolclass=NullPool)
+    captured = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        if "ORDER BY" in statement and not statement.lstrip().startswith("EXPLAIN"):
+            captured.append((statement, parameters))
+
+    try:
+        async with AsyncSession(engine) as session:
+            site_id = (
+                await session.execute(text("SELECT site_id FROM sessions WHERE site_id IS NOT NULL LIMIT 1"))
+            ).scalar_one_or_none()
+            if site_id is None:
+                pytest.skip("Aucune session avec un site")
+            # The page query exactly as the endpoint builds it
+            await _fetch_sessions(
+                session, [site_id], date(2024, 1, 1), date(2024, 1, 31), page=1, page_size=50, include_total=False
+            )
+            statement, parameters = captured[-1]
+            # Rolled back below. The timestamp-only index competes on cost with time-ordered data, and small
+            # test databases favour a sequential scan whatever the indexes: neither is what is checked here
+            await session.execute(text("DROP INDEX IF EXISTS idx_sessions_started"))
+            await session.execute(text("SET LOCAL enable_seqscan = off"))
+            connection = await session.connection()
+            plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar_one()
+            await session.rollback()
+    finally:
+        await engine.dispose()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+def test_sessions_page_uses_site_started_index() -> None:
+    plan = asyncio.run(_explain_sessions_page())
+    nodes = list(_nodes(plan))
+    node_types = [node["Node Type"] for node in nodes]
+
+    assert "Seq Scan" not in node_types
+    assert "Sort" not in node_types
+    scans = [node for node in nodes if node["Node Type"] in ("Index Scan", "Index Only Scan")]
+    assert [scan["Index Name"] for scan in scans] == ["idx_sessions_site_started"]
+    # Both the site and the date range are index conditions, not filters
+    assert "site_id" in scans[0]["Index Cond"] and "started_at" in scans[0]["Index Cond"]